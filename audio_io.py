@@ -0,0 +1,160 @@
+from scipy.io import wavfile
+import struct
+import numpy as np
+
+# Formatos de muestra soportados por WavWriter: (tipo de numpy, código de formato WAV).
+SAMPLE_FORMATS = {
+    "int16": (np.dtype("<i2"), 1),
+    "float32": (np.dtype("<f4"), 3),
+    "float64": (np.dtype("<f8"), 3),
+}
+
+
+# Función read_audio: Abre un archivo wav sin cargarlo completo en memoria: los datos quedan mapeados desde el disco
+# (np.memmap) y solo se leen las partes que se usan.
+# Entradas:
+#           - name: String, nombre del archivo de audio.
+#           - channel: None para entregar todos los canales (arreglo 2D si el audio tiene más de uno), un entero para
+#                      entregar solo ese canal, "mix" para el promedio de todos los canales, o "lazy_mix" para una vista
+#                      del promedio que se calcula por trozos (ver ChannelMix).
+#           - mmap: Booleano, si es False el archivo se lee completo (necesario para formatos que scipy no puede mapear,
+#                   como PCM de 24 bits).
+# Salida:
+#           - Arreglo, [frecuencia de muestreo, datos del audio].
+def read_audio(name, channel=None, mmap=True):
+    try:
+        rate, data = wavfile.read(name, mmap=mmap)
+    except ValueError:
+        rate, data = wavfile.read(name)
+    return [rate, select_channel(data, channel)]
+
+
+# Función select_channel: Aplica la selección de canales a un arreglo de audio (o a un bloque de él).
+# Entradas:
+#           - data: Arreglo, audio de una dimensión (mono) o de dos (muestras x canales).
+#           - channel: None, entero, "mix" o "lazy_mix", con el mismo significado que en read_audio.
+# Salida:
+#           - Arreglo con los canales seleccionados. Un canal de un memmap sigue siendo una vista, sin copiar datos.
+def select_channel(data, channel):
+    if data.ndim == 1 or channel is None:
+        return data
+    if channel == "mix":
+        return data.mean(axis=1)
+    if channel == "lazy_mix":
+        return ChannelMix(data)
+    return data[:, channel]
+
+
+# Clase ChannelMix: Vista perezosa del promedio de los canales de un audio. Se comporta como un arreglo de una dimensión
+# que se puede cortar en rebanadas, y solo calcula la mezcla del trozo pedido (útil sobre un np.memmap).
+class ChannelMix:
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return np.asarray(self.data[index]).mean(axis=-1)
+
+
+# Función channel_count: Número de canales de un arreglo de audio.
+def channel_count(data):
+    return 1 if data.ndim == 1 else data.shape[1]
+
+
+# Función read_blocks: Lee un archivo wav por bloques, con memoria acotada.
+# Entradas:
+#           - name: String, nombre del archivo de audio.
+#           - block_size: Entero, número de muestras por bloque.
+#           - channel: None, entero o "mix", con el mismo significado que en read_audio.
+# Salida:
+#           - rate: Entero, frecuencia de muestreo.
+#           - Generador de arreglos, bloques consecutivos del audio (copiados a memoria).
+def read_blocks(name, block_size, channel=None):
+    rate, data = read_audio(name)
+
+    def blocks():
+        for i in range(0, len(data), block_size):
+            yield np.array(select_channel(data[i:i + block_size], channel))
+    return rate, blocks()
+
+
+# Clase WavWriter: Escribe un archivo wav por bloques en el formato de muestra indicado. La cabecera se escribe al inicio
+# con tamaños provisorios y se corrige al cerrar, por lo que nunca se necesita la señal completa en memoria.
+# Los bloques en punto flotante se consideran en el rango [-1, 1] al escribir en int16 (se recortan fuera de él).
+class WavWriter:
+    # Constructor
+    # Entradas:
+    #           - name: String, nombre del archivo a escribir.
+    #           - rate: Entero, frecuencia de muestreo.
+    #           - channels: Entero, número de canales.
+    #           - sample_format: String, "int16", "float32" o "float64".
+    def __init__(self, name, rate, channels=1, sample_format="int16"):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError("Formato de muestra no soportado: " + str(sample_format))
+        self.dtype, self.format_code = SAMPLE_FORMATS[sample_format]
+        self.rate = int(rate)
+        self.channels = channels
+        self.frames = 0
+        self.file = open(name, "wb")
+        self._write_header()
+
+    def _write_header(self):
+        block_align = self.channels * self.dtype.itemsize
+        data_size = self.frames * block_align
+        fmt = struct.pack("<HHIIHH", self.format_code, self.channels, self.rate, self.rate * block_align,
+                          block_align, 8 * self.dtype.itemsize)
+        chunks = b""
+        if self.format_code == 3:
+            # Los formatos no PCM llevan cbSize en el bloque fmt y un bloque fact con el número de muestras.
+            fmt += struct.pack("<H", 0)
+            chunks = b"fact" + struct.pack("<II", 4, self.frames)
+        header = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + chunks + b"data" + struct.pack("<I",
+                                                                                                         data_size)
+        self.file.seek(0)
+        self.file.write(b"RIFF" + struct.pack("<I", len(header) + data_size) + header)
+
+    # Función write: Agrega un bloque al archivo.
+    # Entrada:
+    #           - block: Arreglo, muestras (1D para un canal, o muestras x canales).
+    def write(self, block):
+        block = np.asarray(block)
+        if block.ndim == 1:
+            block = block[:, None]
+        if block.shape[1] != self.channels:
+            raise ValueError("El bloque tiene " + str(block.shape[1]) + " canales, se esperaban " +
+                             str(self.channels))
+        if self.dtype.kind == "i" and block.dtype.kind == "f":
+            block = np.clip(block, -1, 1) * np.iinfo(self.dtype).max
+        self.file.write(np.ascontiguousarray(block, dtype=self.dtype).tobytes())
+        self.frames += len(block)
+
+    # Función close: Corrige la cabecera con los tamaños finales y cierra el archivo.
+    def close(self):
+        if not self.file.closed:
+            self.file.seek(0, 2)
+            self._write_header()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# Función write_audio: Escribe un archivo wav completo (o un iterable de bloques) en el formato indicado.
+# Entradas:
+#           - name: String, nombre del archivo a escribir.
+#           - rate: Entero, frecuencia de muestreo.
+#           - blocks: Arreglo o iterable de arreglos con las muestras.
+#           - sample_format: String, "int16", "float32" o "float64".
+#           - channels: Entero, número de canales.
+def write_audio(name, rate, blocks, sample_format="int16", channels=1):
+    if isinstance(blocks, np.ndarray):
+        channels = channel_count(blocks)
+        blocks = [blocks]
+    with WavWriter(name, rate, channels, sample_format) as writer:
+        for block in blocks:
+            writer.write(block)
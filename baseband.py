@@ -0,0 +1,106 @@
+from scipy.integrate import cumtrapz
+import numpy as np
+import precision
+import resampler
+
+
+# Función baseband_rate: Frecuencia de muestreo de la simulación en banda base. Depende solo del ancho de banda del
+# mensaje (y de la desviación en FM), no de la frecuencia de la portadora. Se usa un múltiplo entero de la frecuencia de
+# muestreo del mensaje para que los cambios de frecuencia sean simples.
+# Entradas:
+#           - data: Arreglo, [frecuencia de muestreo, datos del mensaje].
+#           - percentage: Entero, porcentaje de modulación.
+#           - scheme: String, "AM" o "FM".
+# Salida:
+#           - Entero, frecuencia de muestreo de la envolvente compleja.
+def baseband_rate(data, percentage, scheme):
+    rate = data[0]
+    if scheme == "AM" or len(data[1]) == 0:
+        return rate
+    # Regla de Carson: ancho de banda = 2*(desviación máxima + ancho de banda del mensaje).
+    deviation = (percentage/100) * np.max(np.abs(data[1])) / (2*np.pi)
+    bandwidth = 2*(deviation + rate/2)
+    return rate * max(1, int(np.ceil(bandwidth/rate)))
+
+
+# Función am_modulation_iq: Modulación AM en banda base. La señal pasabanda (1+m*x)*cos(2*pi*f*t) corresponde a la
+# parte real de z*exp(j*2*pi*f*t) con envolvente z = 1+m*x.
+# Entradas:
+#           - data: Arreglo, [frecuencia de muestreo, datos del mensaje].
+#           - percentage: Entero, porcentaje de modulación.
+# Salida:
+#           - z: Arreglo complejo, envolvente compleja de la señal modulada.
+#           - bb_rate: Entero, frecuencia de muestreo de la envolvente.
+def am_modulation_iq(data, percentage):
+    m = percentage/100
+    z = (1 + m*precision.working(data[1])).astype(precision.complex_dtype())
+    return z, baseband_rate(data, percentage, "AM")
+
+
+# Función fm_modulation_iq: Modulación FM en banda base. La señal pasabanda cos(2*pi*f*t + m*integral(x)) tiene
+# envolvente compleja z = exp(j*m*integral(x)).
+# Entradas:
+#           - data: Arreglo, [frecuencia de muestreo, datos del mensaje].
+#           - percentage: Entero, porcentaje de modulación.
+# Salida:
+#           - z: Arreglo complejo, envolvente compleja de la señal modulada.
+#           - bb_rate: Entero, frecuencia de muestreo de la envolvente.
+def fm_modulation_iq(data, percentage):
+    m = percentage/100
+    bb_rate = baseband_rate(data, percentage, "FM")
+    samples = np.arange(0, len(data[1])/data[0], 1/bb_rate)
+    information = resampler.resample(data[1], data[0], bb_rate, len(samples))
+    integral_info = cumtrapz(information, samples, initial=0)
+    # La integral (fase) se calcula en doble precisión; solo la envolvente queda en la precisión de trabajo.
+    return precision.working(np.exp(1j*m*integral_info)), bb_rate
+
+
+# Función am_demodulation_iq: Demodulación AM coherente en banda base, equivalente a redes4.am_demodulation (producto
+# con la portadora, filtro y cambio a la frecuencia del mensaje): el producto pasabanda vale Re(z)/2 más un término en
+# 2*f, que el filtro de salida elimina.
+# Entradas:
+#           - z: Arreglo complejo, envolvente compleja de la señal modulada (una o varias filas).
+#           - bb_rate: Entero, frecuencia de muestreo de la envolvente.
+#           - meta_data: Arreglo, [frecuencia de muestreo del mensaje, número de muestras del mensaje].
+# Salida:
+#           - Arreglo con la señal demodulada a la frecuencia de muestreo del mensaje.
+def am_demodulation_iq(z, bb_rate, meta_data):
+    return resampler.resample(np.real(z)/2, bb_rate, meta_data[0], meta_data[1])
+
+
+# Función fm_demodulation_iq: Demodulación FM en banda base. El ángulo entre muestras consecutivas de la envolvente es
+# el incremento de fase, igual que en el discriminador de redes4.fm_demodulation pero sin bajar desde la portadora.
+# Entradas:
+#           - z: Arreglo complejo, envolvente compleja de la señal modulada (una o varias filas).
+#           - bb_rate: Entero, frecuencia de muestreo de la envolvente.
+#           - percentage: Entero, porcentaje de modulación.
+#           - meta_data: Arreglo, [frecuencia de muestreo del mensaje, número de muestras del mensaje].
+# Salida:
+#           - Arreglo con el mensaje recuperado a la frecuencia de muestreo del mensaje.
+def fm_demodulation_iq(z, bb_rate, percentage, meta_data):
+    if z.shape[-1] < 2:
+        return np.zeros(z.shape[:-1] + (meta_data[1],))
+    # Cada incremento corresponde al punto medio entre dos muestras; se promedian dos incrementos vecinos para que el
+    # resultado quede centrado en cada muestra (sin retardo de media muestra). Con varias filas se procesa cada una.
+    increments = np.angle(z[..., 1:]*np.conj(z[..., :-1]))
+    phase_rate = np.concatenate([increments[..., :1], (increments[..., :-1] + increments[..., 1:])/2,
+                                 increments[..., -1:]], axis=-1)
+    # Con índice 0 no hay mensaje que recuperar y se entregan ceros, igual que en redes4.fm_demodulation.
+    demod_signal = phase_rate * (bb_rate / (percentage/100) if percentage != 0 else 0.0)
+    return resampler.resample(demod_signal, bb_rate, meta_data[0], meta_data[1])
+
+
+# Función upconvert: Lleva una envolvente compleja a la señal pasabanda muestreada a 4 veces la portadora, igual a la que
+# generan am_modulation y fm_modulation. Solo se usa en las etapas que la necesitan (por ejemplo los espectros).
+# Entradas:
+#           - z: Arreglo complejo, envolvente compleja.
+#           - bb_rate: Entero, frecuencia de muestreo de la envolvente.
+#           - freq: Frecuencia de la portadora.
+# Salida:
+#           - passband: Arreglo, señal pasabanda.
+#           - samples_carrier: Arreglo, muestras de tiempo de la portadora.
+def upconvert(z, bb_rate, freq):
+    samples_carrier = np.arange(0, len(z)/bb_rate, 1/(4*freq))
+    envelope = resampler.resample(z, bb_rate, 4*freq, len(samples_carrier))
+    passband = np.real(envelope*precision.working(np.exp(2j*np.pi*freq*samples_carrier)))
+    return passband, samples_carrier
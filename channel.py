@@ -0,0 +1,104 @@
+import numpy as np
+import precision
+
+# Número de trayectos del modelo de desvanecimiento (suma de sinusoides de Clarke).
+FADING_PATHS = 16
+
+# Fracción de muestras descartada en cada extremo al medir la calidad, para no medir el transitorio de los filtros.
+METRIC_EDGE = 0.02
+
+
+# Función noise_std: Desviación estándar de cada componente (real e imaginaria) del ruido complejo para una SNR de
+# canal. La SNR de canal es la potencia de la señal recibida dividida por la potencia de ruido en un ancho de banda
+# igual al del mensaje, como en la comparación clásica de AM y FM: así la SNR no depende de la frecuencia de muestreo
+# de la envolvente, que en FM es mayor (ver baseband.baseband_rate).
+# Entradas:
+#           - power: Número, potencia media de la envolvente compleja.
+#           - snr_db: Número, SNR de canal en dB.
+#           - bb_rate: Número, frecuencia de muestreo de la envolvente.
+#           - message_rate: Número, frecuencia de muestreo del mensaje.
+# Salida:
+#           - Número.
+def noise_std(power, snr_db, bb_rate, message_rate):
+    variance = power * (bb_rate / message_rate) / 10 ** (snr_db / 10)
+    return np.sqrt(variance / 2)
+
+
+# Función rayleigh_fading: Ganancias complejas de un canal con desvanecimiento plano de Rayleigh (modelo de Clarke,
+# suma de sinusoides con ángulos y fases aleatorias). Con doppler 0 la ganancia es constante en cada ensayo.
+# Entradas:
+#           - rng: np.random.Generator.
+#           - trials: Entero, número de ensayos (filas).
+#           - length: Entero, número de muestras.
+#           - bb_rate: Número, frecuencia de muestreo de la envolvente.
+#           - doppler: Número, desplazamiento Doppler máximo en Hz.
+# Salida:
+#           - Arreglo complejo (ensayos x muestras) con potencia media 1.
+def rayleigh_fading(rng, trials, length, bb_rate, doppler=0.0):
+    if doppler == 0:
+        gains = (rng.standard_normal((trials, 1)) + 1j * rng.standard_normal((trials, 1))) / np.sqrt(2)
+        return np.broadcast_to(gains, (trials, length))
+    angles = rng.uniform(0, 2 * np.pi, (FADING_PATHS, trials, 1))
+    phases = rng.uniform(0, 2 * np.pi, (FADING_PATHS, trials, 1))
+    time = np.arange(length) / bb_rate
+    # Cada trayecto llega con un ángulo distinto y por lo tanto con su propio desplazamiento Doppler. Los trayectos se
+    # suman de a uno (cada uno para todos los ensayos) para no guardar un arreglo por trayecto.
+    gains = np.zeros((trials, length), dtype=complex)
+    for angle, phase in zip(angles, phases):
+        gains += np.exp(1j * (2 * np.pi * doppler * np.cos(angle) * time + phase))
+    return gains / np.sqrt(FADING_PATHS)
+
+
+# Función transmit: Canal entre la modulación y la demodulación: desvanecimiento opcional y ruido blanco gaussiano
+# aditivo, para varios ensayos a la vez (una fila por ensayo, todas con la misma señal transmitida).
+# Entradas:
+#           - z: Arreglo complejo, envolvente compleja transmitida.
+#           - bb_rate: Número, frecuencia de muestreo de la envolvente.
+#           - message_rate: Número, frecuencia de muestreo del mensaje (ver noise_std).
+#           - snr_db: Número, SNR de canal en dB.
+#           - trials: Entero, número de ensayos.
+#           - rng: np.random.Generator.
+#           - fading: None (solo ruido) o "rayleigh".
+#           - doppler: Número, desplazamiento Doppler máximo del desvanecimiento en Hz.
+# Salida:
+#           - received: Arreglo complejo (ensayos x muestras), señal recibida.
+#           - gains: Arreglo complejo con las ganancias del canal (o None sin desvanecimiento).
+def transmit(z, bb_rate, message_rate, snr_db, trials, rng, fading=None, doppler=0.0):
+    dtype = precision.complex_dtype()
+    power = np.mean(np.abs(z) ** 2)
+    gains = None
+    if fading is None:
+        received = np.broadcast_to(z, (trials, len(z))).astype(dtype)
+    elif fading == "rayleigh":
+        gains = rayleigh_fading(rng, trials, len(z), bb_rate, doppler)
+        received = (gains * z).astype(dtype)
+    else:
+        raise ValueError("Desvanecimiento no soportado: " + str(fading))
+    std = noise_std(power, snr_db, bb_rate, message_rate)
+    noise = rng.standard_normal((2, trials, len(z)), dtype=np.float64 if dtype == np.complex128 else np.float32)
+    received.real += std * noise[0]
+    received.imag += std * noise[1]
+    return received, gains
+
+
+# Función quality: Calidad de los mensajes recuperados respecto del original. Se usa la correlación de Pearson, que no
+# depende de la ganancia ni del nivel continuo del demodulador (AM entrega (1+m*mensaje)/2), y la SNR de salida
+# equivalente, que es la SNR del mejor ajuste lineal: 1/(1-correlación^2).
+# Entradas:
+#           - recovered: Arreglo (ensayos x muestras), mensajes recuperados.
+#           - message: Arreglo, mensaje original.
+#           - edge: Número, fracción descartada en cada extremo.
+# Salida:
+#           - correlation: Arreglo, correlación de cada ensayo.
+#           - snr_db: Arreglo, SNR de salida de cada ensayo en dB.
+def quality(recovered, message, edge=METRIC_EDGE):
+    cut = int(len(message) * edge)
+    keep = slice(cut, len(message) - cut)
+    x = np.asarray(message, dtype=float)[keep]
+    y = np.asarray(recovered, dtype=float)[..., keep]
+    x = x - x.mean()
+    y = y - y.mean(axis=-1, keepdims=True)
+    denominator = np.sqrt(np.sum(x ** 2) * np.sum(y ** 2, axis=-1))
+    correlation = np.divide(y @ x, denominator, out=np.zeros(y.shape[:-1]), where=denominator > 0)
+    snr_db = -10 * np.log10(np.maximum(1 - correlation ** 2, 1e-12))
+    return correlation, snr_db
@@ -0,0 +1,99 @@
+from fractions import Fraction
+import numpy as np
+import precision
+import resampler
+
+# Tamaño máximo de la tabla del oscilador. Si el periodo de la portadora (en muestras) es mayor, el coseno se calcula
+# directamente.
+NCO_TABLE_SIZE = 1 << 16
+
+
+# Clase DDC: Conversor digital de bajada. En una sola pasada multiplica la señal por la portadora local (oscilador
+# numérico), filtra y diezma en dos etapas: un diezmado entero con un filtro FIR corto, que solo se calcula en las
+# muestras que se conservan, y un conversor polifásico racional hasta la frecuencia de muestreo final, cuyo filtro
+# elimina todo lo que está fuera de la banda del mensaje (incluido el término en 2*freq). Procesa por bloques, igual
+# que resampler.Resampler.
+class DDC:
+    # Constructor
+    # Entradas:
+    #           - rate: Número, frecuencia de muestreo de la señal modulada.
+    #           - freq: Número, frecuencia de la portadora.
+    #           - out_rate: Número, frecuencia de muestreo de salida (la del mensaje).
+    #           - dtype: Precisión de trabajo (ver precision), o None para la actual.
+    def __init__(self, rate, freq, out_rate, dtype=None):
+        self.dtype = precision.resolve(dtype)
+        # Oscilador: cos(2*pi*freq*n/rate) = cos(2*pi*p*n/q) es periódico de periodo q. Si q es chico se guarda un
+        # periodo y la portadora se arma repitiéndolo, sin evaluar cosenos.
+        self._p, self._q = resampler.rational_ratio(rate, freq)
+        self._rate = rate
+        self._freq = freq
+        self._period = None
+        if self._q <= NCO_TABLE_SIZE:
+            phase = 2 * np.pi * ((np.arange(self._q) * self._p) % self._q) / self._q
+            self._period = np.cos(phase).astype(self.dtype)
+        self._n = 0
+        # Con la portadora a un cuarto de la frecuencia de muestreo (el caso de redes4, que muestrea a 4*freq) la
+        # portadora local vale 1, 0, -1, 0, ...: las muestras impares del producto son nulas y basta con procesar las
+        # pares, con signo alternado, como una señal a rate/2 con ceros intercalados (interpolación por 2 sin filtro).
+        self._quarter = self._q == 4
+        stride = 2 if self._quarter else 1
+
+        # Factor de la primera etapa: la frecuencia intermedia queda sobre 2*out_rate, para dejar una banda de
+        # transición de al menos out_rate. En el caso de un cuarto se usa un factor impar (coprimo con 2).
+        factor = max(1, int(rate // (2 * out_rate)))
+        if self._quarter and factor % 2 == 0:
+            factor -= 1
+        self._mid_rate = Fraction(rate) / factor
+        self._decimator = resampler.Resampler(stride, factor, resampler.decimation_filter(rate, out_rate, factor),
+                                               self.dtype)
+        self._resampler = resampler.Resampler(*resampler.rational_ratio(self._mid_rate, out_rate), dtype=self.dtype)
+
+    # Función _oscillator: Siguientes count muestras de la portadora local.
+    def _oscillator(self, count):
+        start = self._n
+        self._n += count
+        if self._period is not None:
+            period = np.roll(self._period, -(start % self._q))
+            return np.tile(period, -(-count // self._q))[:count]
+        return np.cos(2 * np.pi * self._freq * (start + np.arange(count)) / self._rate).astype(self.dtype)
+
+    # Función _mix: Producto de un bloque con la portadora local (en el caso de un cuarto, solo las muestras pares).
+    def _mix(self, block):
+        if not self._quarter:
+            return block * self._oscillator(block.shape[-1])
+        start = self._n
+        self._n += block.shape[-1]
+        even = block[..., start % 2::2]
+        # La muestra par 2k vale cos(pi*p*k) = (-1)^k (p es impar).
+        signs = np.tile(np.array([1, -1], dtype=self.dtype), -(-even.shape[-1] // 2) + 1)
+        signs = signs[(start + 1) // 2 % 2:][:even.shape[-1]]
+        return even * signs
+
+    # Función process: Recibe un bloque de la señal modulada y entrega el bloque de salida que ya puede calcularse.
+    # Entrada:
+    #           - block: Arreglo, bloque consecutivo de la señal (una o varias filas; se procesa el último eje).
+    # Salida:
+    #           - Arreglo con el producto con la portadora, filtrado, a la frecuencia de muestreo de salida.
+    def process(self, block):
+        return self._resampler.process(self._decimator.process(self._mix(precision.working(block, self.dtype))))
+
+    # Función flush: Entrega las muestras restantes al terminar la señal.
+    def flush(self):
+        tail = self._resampler.process(self._decimator.flush())
+        return np.concatenate([tail, self._resampler.flush()], axis=-1)
+
+
+# Función downconvert: Aplica el DDC a una señal completa.
+# Entradas:
+#           - x: Arreglo, señal modulada (una o varias filas).
+#           - rate: Número, frecuencia de muestreo de la señal.
+#           - freq: Número, frecuencia de la portadora.
+#           - out_rate: Número, frecuencia de muestreo de salida.
+#           - length: Entero opcional, número exacto de muestras de la salida.
+#           - dtype: Precisión de trabajo (ver precision), o None para la actual.
+# Salida:
+#           - Arreglo con la señal llevada a banda base a out_rate.
+def downconvert(x, rate, freq, out_rate, length=None, dtype=None):
+    converter = DDC(rate, freq, out_rate, dtype)
+    out = np.concatenate([converter.process(x), converter.flush()], axis=-1)
+    return resampler.fit_length(out, length)
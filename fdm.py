@@ -0,0 +1,168 @@
+from scipy.integrate import cumtrapz
+import scipy.signal as sg
+import numpy as np
+import lab2lib
+import precision
+import resampler
+
+# Orden por defecto del filtro paso bajo con que el demultiplexor separa cada estación. Es mayor que el de lab2lib
+# porque debe rechazar las estaciones vecinas, no solo el término en 2*f.
+DEMUX_ORDER = 6
+
+
+# Función split_channels: Separa un audio de varios canales (por ejemplo open_audio(nombre, channel=None)) en un
+# mensaje por canal, para transmitir cada canal como una estación.
+# Entrada:
+#           - data: Arreglo, [frecuencia de muestreo, datos (muestras x canales)].
+# Salida:
+#           - Lista de arreglos [frecuencia de muestreo, datos del canal].
+def split_channels(data):
+    if data[1].ndim == 1:
+        return [data]
+    return [[data[0], data[1][:, c]] for c in range(data[1].shape[1])]
+
+
+# Función bandwidth: Ancho de banda a cada lado de la portadora que ocupa una estación: la mitad de la frecuencia de
+# muestreo del mensaje en AM, y según la regla de Carson (desviación máxima + ancho del mensaje) en FM.
+# Entradas:
+#           - data: Arreglo, [frecuencia de muestreo, datos del mensaje].
+#           - percentage: Número, porcentaje de modulación.
+#           - scheme: String, "AM" o "FM".
+# Salida:
+#           - Número, ancho de banda en Hz.
+def bandwidth(data, percentage, scheme):
+    if scheme == "AM" or len(data[1]) == 0:
+        return data[0] / 2
+    return (percentage/100) * np.max(np.abs(data[1])) / (2*np.pi) + data[0] / 2
+
+
+# Función check_plan: Verifica que las estaciones no se superpongan y que la banda completa quepa bajo la frecuencia de
+# Nyquist de la señal compuesta.
+# Entradas:
+#           - freqs: Lista, frecuencias de las portadoras.
+#           - bandwidths: Lista, ancho de banda a cada lado de cada portadora.
+#           - rate: Número, frecuencia de muestreo de la señal compuesta.
+def check_plan(freqs, bandwidths, rate):
+    order = np.argsort(freqs)
+    low = np.asarray(freqs, dtype=float)[order] - np.asarray(bandwidths, dtype=float)[order]
+    high = np.asarray(freqs, dtype=float)[order] + np.asarray(bandwidths, dtype=float)[order]
+    if low[0] < 0 or high[-1] > rate / 2:
+        raise ValueError("Las estaciones no caben entre 0 y la frecuencia de Nyquist (" + str(rate / 2) + " Hz)")
+    overlap = np.flatnonzero(low[1:] < high[:-1])
+    if len(overlap) > 0:
+        i = order[overlap[0]]
+        j = order[overlap[0] + 1]
+        raise ValueError("Las estaciones en " + str(freqs[i]) + " Hz y " + str(freqs[j]) + " Hz se superponen")
+
+
+# Función _per_station: Convierte un parámetro escalar o por estación en un arreglo columna (una fila por estación).
+def _per_station(value, count):
+    value = np.broadcast_to(np.asarray(value, dtype=float), (count,))
+    return value[:, None]
+
+
+# Función _messages_at_rate: Lleva todos los mensajes a la frecuencia de muestreo de la señal compuesta, como un arreglo
+# 2D (una fila por estación). Los mensajes con la misma frecuencia de muestreo se convierten juntos, en una sola
+# llamada al conversor; los más cortos se completan con silencio.
+def _messages_at_rate(messages, rate, length, dtype):
+    information = np.zeros((len(messages), length), dtype=dtype)
+    groups = {}
+    for i, message in enumerate(messages):
+        groups.setdefault(message[0], []).append(i)
+    for message_rate, rows in groups.items():
+        stacked = np.zeros((len(rows), max(len(messages[i][1]) for i in rows)), dtype=dtype)
+        for k, i in enumerate(rows):
+            stacked[k, :len(messages[i][1])] = messages[i][1]
+        information[rows] = resampler.resample(stacked, message_rate, rate, length, dtype)
+    return information
+
+
+# Función _phases: Fase 2*pi*f*t de cada portadora (una fila por estación), en doble precisión.
+def _phases(freqs, rate, length):
+    return 2 * np.pi * np.asarray(freqs, dtype=float)[:, None] * (np.arange(length) / rate)
+
+
+# Función multiplex: Multiplexación por división de frecuencia. Modula N mensajes sobre N portadoras (AM o FM, con las
+# mismas fórmulas que redes4.ModulationContext) y suma las estaciones en una sola señal compuesta. Todas las
+# estaciones se calculan juntas como arreglos 2D, por lo que el tiempo y la memoria crecen linealmente con N.
+# Entradas:
+#           - messages: Lista de arreglos [frecuencia de muestreo, datos del mensaje] (ver split_channels).
+#           - freqs: Lista, frecuencia de la portadora de cada estación.
+#           - scheme: String, "AM" o "FM" (el mismo para todas las estaciones).
+#           - percentages: Número o lista, porcentaje de modulación (uno para todas o uno por estación).
+#           - rate: Número opcional, frecuencia de muestreo de la señal compuesta. Por defecto 4 veces la mayor
+#                   portadora, como en redes4.
+#           - dtype: Precisión de trabajo (ver precision), o None para la actual.
+# Salida:
+#           - Arreglo, [frecuencia de muestreo, señal compuesta]. La duración es la del mensaje más largo.
+def multiplex(messages, freqs, scheme="AM", percentages=100, rate=None, dtype=None):
+    if len(messages) != len(freqs):
+        raise ValueError("Se necesita una portadora por mensaje")
+    dtype = precision.resolve(dtype)
+    if rate is None:
+        rate = 4 * max(freqs)
+    percentages = np.broadcast_to(percentages, (len(messages),))
+    check_plan(freqs, [bandwidth(m, p, scheme) for m, p in zip(messages, percentages)], rate)
+    length = int(np.ceil(max(len(m[1]) / m[0] for m in messages) * rate))
+    m = _per_station(percentages, len(messages)) / 100
+    information = _messages_at_rate(messages, rate, length, dtype)
+    phases = _phases(freqs, rate, length)
+    if scheme == "FM":
+        # cos(2*pi*f*t + m*integral(information)); la fase se acumula en doble precisión.
+        phases += m * cumtrapz(information, dx=1/rate, axis=-1, initial=0)
+    # Los cálculos se hacen sobre el mismo arreglo para no crear otro del tamaño de todas las estaciones.
+    channels = np.cos(phases, out=phases).astype(dtype, copy=False)
+    if scheme == "AM":
+        # carrier + m*information*carrier, igual que en redes4.
+        information *= m.astype(dtype)
+        information += 1
+        channels *= information
+    return [rate, channels.sum(axis=0)]
+
+
+# Función demultiplex: Separa las estaciones de una señal compuesta y recupera sus mensajes. Cada estación se lleva a
+# banda base (producto con exp(-j*2*pi*f*t), todas juntas como un arreglo 2D) y se filtra con un paso bajo de lab2lib
+# de ancho igual a la banda de la estación, que elimina a las vecinas. Las estaciones con el mismo ancho de banda se
+# filtran en una sola llamada. El filtro se aplica hacia adelante y hacia atrás (fase cero), para que los mensajes
+# queden alineados con los originales. Luego se demodula (AM coherente o discriminador FM) y se baja a la frecuencia
+# del mensaje.
+# Entradas:
+#           - composite: Arreglo, [frecuencia de muestreo, señal compuesta] (ver multiplex).
+#           - freqs: Lista, frecuencia de la portadora de cada estación.
+#           - bandwidths: Número o lista, ancho de banda a cada lado de cada portadora (ver bandwidth).
+#           - meta_data: Arreglo, [frecuencia de muestreo de los mensajes, número de muestras de los mensajes].
+#           - scheme: String, "AM" o "FM".
+#           - percentages: Número o lista, porcentaje de modulación de cada estación (debe ser positivo).
+#           - filter_type, order, cheb_rp: Filtro paso bajo, con los tipos de lab2lib ("butter", "cheb" o "bessel").
+#           - dtype: Precisión de trabajo (ver precision), o None para la actual.
+# Salida:
+#           - Arreglo 2D con el mensaje recuperado de cada estación (una fila por estación).
+def demultiplex(composite, freqs, bandwidths, meta_data, scheme="AM", percentages=100, filter_type="butter",
+                order=DEMUX_ORDER, cheb_rp=1, dtype=None):
+    dtype = precision.resolve(dtype)
+    rate, signal = composite
+    m = _per_station(percentages, len(freqs)) / 100
+    if np.any(m <= 0):
+        raise ValueError("El porcentaje de modulación debe ser positivo para recuperar el mensaje")
+    bandwidths = np.broadcast_to(np.asarray(bandwidths, dtype=float), (len(freqs),))
+    phases = _phases(freqs, rate, len(signal))
+    mixer = np.empty(phases.shape, dtype=precision.complex_dtype(dtype))
+    np.cos(phases, out=mixer.real)
+    np.sin(phases, out=phases)
+    np.negative(phases, out=mixer.imag)
+    del phases
+    mixer *= precision.working(signal, dtype)
+    for width in np.unique(bandwidths):
+        rows = np.flatnonzero(bandwidths == width)
+        sos = lab2lib.filter_sos([rate], float(width), filter_type, "low", order, cheb_rp)
+        if sos is None:
+            raise ValueError("Tipo de filtro no soportado: " + str(filter_type))
+        mixer[rows] = sg.sosfiltfilt(sos.astype(dtype), mixer[rows], axis=-1)
+    if scheme == "AM":
+        # La envolvente en banda base es (1+m*mensaje)/2.
+        recovered = (2 * mixer.real - 1) / m.astype(dtype)
+    else:
+        # El incremento de fase entre muestras es m*mensaje/rate.
+        step = np.angle(mixer[:, 1:] * np.conj(mixer[:, :-1]))
+        recovered = (np.concatenate([step[:, :1], step], axis=-1) * (rate / m)).astype(dtype, copy=False)
+    return resampler.resample(recovered, rate, meta_data[0], meta_data[1], dtype)
@@ -1,15 +1,22 @@
+import functools
 import scipy.signal as sg
 import scipy.fftpack as fftp
 from scipy.io import wavfile
 import numpy as np
 import matplotlib.pyplot as plt
+import plotting
+import precision
+import profiling
+import spectrum
+import stft
 
 
-def read_wav(name):
+def read_wav(name, mmap=False):
     # Función para leer el archivo wav. Wrapper de scipy.io.wavfile.read(name)
     # Retorna una tupla con el sample rate y los datos leidos del wav_data
+    # mmap: si es True los datos se mapean desde el disco (np.memmap) en vez de cargarse completos
     # *
-    return wavfile.read(name)
+    return wavfile.read(name, mmap=mmap)
 
 
 def write_wav(wav_data, file_name):
@@ -22,12 +29,17 @@ def write_wav(wav_data, file_name):
         wavfile.write(file_name, wav_data[0], wav_data[1])
 
 
-def fft(wav_data):
+def fft(wav_data, dtype=None):
     # Función que calcula la transformada de fourier. Encapsula scipy.fftpack.fft y scipy.fftpack.fftfreq
     # wav_data: obtejo con los datos del wav (leidos con read_wav)
+    # dtype: precisión del cálculo ("float64" o "float32", ver precision). Por defecto la precisión actual
     # retorna un arreglo con los valores de la transformada y otro con las frecuencias correspondientes
-    data = wav_data[1]
-    t = fftp.fft(data)
+    # Para señales reales se usa la FFT real (guardada en caché por el módulo spectrum) y la simetría conjugada
+    data = precision.working(wav_data[1], dtype)
+    if np.iscomplexobj(data):
+        t = fftp.fft(data)
+    else:
+        t = spectrum.full_fft(data)
     f = fftp.fftfreq(len(data))
     return t, f
 
@@ -61,7 +73,7 @@ def plot_wav(wav_data, abs_values=False, save_fig=None, title="None"):
         plt.close()
 
 
-def plot_fourier(wav_data, abs_values=True, hertz=True, pos_freq=False, save_fig=None, title=None):
+def plot_fourier(wav_data, abs_values=True, hertz=True, pos_freq=False, save_fig=None, title=None, dtype=None):
     # Función para graficar la transformada de fourier
     # wav_data: objeto con los datos del wav (leidos con read_wav)
     # abs_values: aplicar valor absoluto a la Magnitud
@@ -69,11 +81,12 @@ def plot_fourier(wav_data, abs_values=True, hertz=True, pos_freq=False, save_fig
     # pos_freq: Solo graficar frecuencias positivas
     # save_fig: String con el nombre con el que se desea guardar la imagen con el grafico. De no
     # ingresarse algún valor, los graficos se muestran en pantalla
+    # dtype: precisión de la transformada (ver fft)
 
     # Nota: Tiene problemas al graficar
 
     # Toma los valores de la transformada de fourier y las frecuencias correspondientes
-    t, f = fft(wav_data)
+    t, f = fft(wav_data, dtype)
 
     length = len(t)
 
@@ -105,41 +118,67 @@ def plot_fourier(wav_data, abs_values=True, hertz=True, pos_freq=False, save_fig
         plt.close()
 
 
-def spectrogram(wav_data, scaling="spectrum"):
+def spectrogram(wav_data, scaling="spectrum", nperseg=1024, noverlap=None, window=("tukey", .25), dtype=None):
     # Funcion para generar los datos del espectrograma
+    # nperseg, noverlap y window definen la resolución en tiempo y frecuencia (por defecto los valores de siempre)
+    # dtype: precisión del cálculo (ver precision). Por defecto la precisión actual
     # Retorna una tupla con el arreglo de las frecuencis de muestreo, arreglo
     # de los segmentos de tiempo y los datos del espectrograma
 
-    return sg.spectrogram(wav_data[1], fs=wav_data[0], nperseg=1024, scaling=scaling)
+    return sg.spectrogram(precision.working(wav_data[1], dtype), fs=wav_data[0], nperseg=nperseg, noverlap=noverlap,
+                          window=window, scaling=scaling)
 
 
-def plot_spectrogram(wav_data, cmap="gist_stern", save_fig=None, title=None):
+@profiling.profiled()
+def plot_spectrogram(wav_data, cmap="gist_stern", save_fig=None, title=None, nperseg=1024, noverlap=None,
+                     window=("tukey", .25), out_file=None, dtype=None):
     # Función para graficar el espectrograma
     # wav_data: datos del wav (sample_rate, datos)
     # cmap: String con el color-map a utilizar
-
-    f, t, Sxx = spectrogram(wav_data)
+    # nperseg, noverlap, window: resolución del espectrograma (ver spectrogram)
+    # out_file: String opcional, archivo .npy donde se guarda el espectrograma completo (segmentos x frecuencias)
+    # dtype: precisión del cálculo y del archivo (ver precision). Por defecto la precisión actual
+
+    # Si se guarda en un archivo, el gráfico se genera según el modo del módulo plotting (puede omitirse)
+    if isinstance(save_fig, str) and not plotting.enabled() and out_file is None:
+        return
+
+    # El espectrograma se calcula por bloques y se reduce al tamaño en pixeles de la figura a medida que se genera,
+    # conservando el máximo de cada grupo, por lo que la matriz completa nunca queda en memoria
+    f, t, Sxx = stft.spectrogram_view(wav_data[1], wav_data[0], plotting.PIXEL_WIDTH, plotting.PIXEL_HEIGHT,
+                                      nperseg=nperseg, noverlap=noverlap, window=window, out_file=out_file,
+                                      dtype=dtype)
     # Sxx = Sxx/np.max(Sxx)
-    Sxx = 10 * np.log10(Sxx)
+    # En float32 pueden quedar ceros exactos (subdesbordamiento); se acotan para no obtener -inf en la escala en dB
+    Sxx = 10 * np.log10(np.maximum(Sxx, np.finfo(Sxx.dtype).tiny))
 
-    plt.ioff()
-    plt.figure()
+    if save_fig is None:
+        plt.ioff()
+        plt.figure()
+        _draw_spectrogram(plt.gcf(), plt.gca(), t, f, Sxx, cmap, title)
+        plt.show()
+        plt.close()
+    elif isinstance(save_fig, str):
+        plotting.submit(_render_spectrogram, save_fig, t, f, Sxx, cmap, title)
 
-    plt.pcolormesh(t, f, Sxx, cmap=plt.get_cmap(cmap))
-    plt.colorbar(label="Amplitud [db]")
+
+def _draw_spectrogram(figure, axes, t, f, Sxx, cmap, title):
+    # Función que dibuja el espectrograma (ya en dB) en los ejes entregados
+    mesh = axes.pcolormesh(t, f, Sxx, cmap=plt.get_cmap(cmap))
+    figure.colorbar(mesh, ax=axes, label="Amplitud [db]")
 
     if isinstance(title, str):
-        plt.title(title)
+        axes.set_title(title)
 
-    plt.ylabel('Frequencia [Hz]')
-    plt.xlabel('Tiempo [sec]')
+    axes.set_ylabel('Frequencia [Hz]')
+    axes.set_xlabel('Tiempo [sec]')
 
-    if save_fig is None:
-        plt.show()
-        plt.close()
-    elif isinstance(save_fig, str):
-        plt.savefig(save_fig)
-        plt.close()
+
+def _render_spectrogram(save_fig, t, f, Sxx, cmap, title):
+    # Función que dibuja y guarda el espectrograma sin pasar por pyplot (puede llamarse desde otro hilo)
+    figure = plotting.new_figure(figsize=plt.rcParams["figure.figsize"], dpi=plt.rcParams["figure.dpi"])
+    _draw_spectrogram(figure, figure.add_subplot(111), t, f, Sxx, cmap, title)
+    plotting.save_figure(figure, save_fig)
 
 
 def filter_data(wav_data, freq, filter_type="butter", btype="low", order=3, cheb_rp=1):
@@ -171,7 +210,78 @@ def filter_data(wav_data, freq, filter_type="butter", btype="low", order=3, cheb
     return b, a
 
 
-def filter_signal(wav_data, freq, filter_type="butter", btype="low", order=3, cheb_rp=1):
+# Cantidad máxima de diseños de filtro guardados en la caché.
+FILTER_CACHE_SIZE = 64
+
+
+@functools.lru_cache(maxsize=FILTER_CACHE_SIZE)
+def _design_sos(sample_rate, freq, filter_type, btype, order, cheb_rp):
+    # Diseña el filtro en secciones de segundo orden (sos). Se guarda en caché por
+    # (frecuencia de muestreo, corte, tipo, btype, orden, rizado), así un mismo filtro se diseña una sola vez.
+    # freq debe ser un escalar o una tupla (para band-pass), para poder usarse como llave de la caché.
+    # Retorna el arreglo sos (compartido por la caché, no debe modificarse) o None si el tipo de filtro no existe
+    wn = np.divide(freq, sample_rate * 0.5)
+
+    if filter_type == "butter" or filter_type.lower() == "butterworth":
+        sos = sg.butter(order, Wn=wn, btype=btype, output="sos")
+    elif filter_type == "cheb" or filter_type.lower() == "chebyshev":
+        sos = sg.cheby1(order, cheb_rp, Wn=wn, btype=btype, output="sos")
+    elif filter_type.lower() == "bessel":
+        sos = sg.bessel(order, Wn=wn, btype=btype, output="sos")
+    else:
+        return None
+
+    return sos
+
+
+def filter_sos(wav_data, freq, filter_type="butter", btype="low", order=3, cheb_rp=1):
+    # Función para obtener el filtro en secciones de segundo orden, numéricamente estable a órdenes altos.
+    # Usa los mismos parámetros que filter_data y retorna el arreglo sos (o None si el tipo no existe)
+    if isinstance(freq, list):
+        freq = tuple(freq)
+    return _design_sos(wav_data[0], freq, filter_type, btype, order, cheb_rp)
+
+
+class Filter:
+    # Filtro con estado: guarda las condiciones iniciales (zi) entre llamadas a process(), de modo que una señal
+    # larga puede filtrarse por bloques con el mismo resultado que filtrarla completa.
+    # sample_rate: frecuencia de muestreo de la señal
+    # freq, filter_type, btype, order, cheb_rp: iguales que en filter_data
+    # dtype: precisión del filtrado (ver precision). Por defecto la precisión actual
+
+    def __init__(self, sample_rate, freq, filter_type="butter", btype="low", order=3, cheb_rp=1, dtype=None):
+        self.sample_rate = sample_rate
+        self.dtype = precision.resolve(dtype)
+        # Igual que en filter_signal: una lista de dos frecuencias es un band-pass
+        if isinstance(freq, list):
+            if len(freq) != 2:
+                raise ValueError("Se debe ingresar una lista de dos frecuencias para usar band-pass")
+            btype = "band"
+        elif btype == "bandpass" or btype == "band":
+            raise ValueError("Se debe ingresar una lista de dos frecuencias para usar band-pass")
+        sos = filter_sos([sample_rate], freq, filter_type, btype, order, cheb_rp)
+        if sos is None:
+            raise ValueError("Tipo de filtro no soportado: " + str(filter_type))
+        # Con float32 los coeficientes también se pasan a float32, o sosfilt haría el cálculo en doble precisión
+        self.sos = sos.astype(self.dtype)
+        self.zi = None
+
+    def process(self, block):
+        # Filtra un bloque de la señal, continuando desde el estado del bloque anterior
+        # block puede tener varias filas (una señal por fila); se filtra el último eje
+        # Retorna el bloque filtrado
+        block = precision.working(block, self.dtype)
+        if self.zi is None:
+            self.zi = np.zeros((self.sos.shape[0],) + block.shape[:-1] + (2,), dtype=block.dtype)
+        new_data, self.zi = sg.sosfilt(self.sos, block, zi=self.zi)
+        return new_data
+
+    def reset(self):
+        # Reinicia el estado del filtro para procesar una nueva señal
+        self.zi = None
+
+
+def filter_signal(wav_data, freq, filter_type="butter", btype="low", order=3, cheb_rp=1, dtype=None):
     # Función para aplicar un filtro a una señal directamente.
     # Retorna una tupla (frecuencia de muestreo, datos de la señal)
     # wav_data: objeto con los datos del wav (leidos con read_wav)
@@ -181,6 +291,7 @@ def filter_signal(wav_data, freq, filter_type="butter", btype="low", order=3, ch
     # btype: forma de aplicar el filtro ("low", "high" o "band")
     # order: Orden del filtro si lo requiere.
     # cheb_rp: factor de rizado (ripple factor) usado por el filtro chebyshev si lo requiere.
+    # dtype: precisión del filtrado (ver precision). Por defecto la precisión actual
 
     if isinstance(freq, list):
         if len(freq) == 2:
@@ -194,10 +305,14 @@ def filter_signal(wav_data, freq, filter_type="butter", btype="low", order=3, ch
             print("Se debe ingresar una lista de dos frecuencias para usar band-pass")
             return None
 
-    b, a = filter_data(wav_data, freq, filter_type, btype, order, cheb_rp)
+    sos = filter_sos(wav_data, freq, filter_type, btype, order, cheb_rp)
+    if sos is None:
+        print("Tipo de filtro no soportado")
+        return None
 
-    # Se aplica el filtro
-    new_data = sg.lfilter(b, a, wav_data[1])
+    # Se aplica el filtro (en secciones de segundo orden, con el diseño guardado en caché)
+    dtype = precision.resolve(dtype)
+    new_data = sg.sosfilt(sos.astype(dtype), precision.working(wav_data[1], dtype))
 
     return wav_data[0], new_data
 
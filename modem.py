@@ -0,0 +1,512 @@
+import argparse
+import asyncio
+import os
+import socket
+import struct
+import sys
+import tempfile
+import time
+import numpy as np
+import audio_io
+import precision
+import redes4
+
+# Protocolo del servicio: la conexión lleva tramas con un largo de 4 bytes (entero sin signo little-endian) seguido de
+# los datos. El cliente envía bloques de muestras mono (por defecto PCM int16) y una trama vacía al terminar. Por cada
+# bloque el servicio responde una trama con las muestras que ya pudo calcular (por defecto float32, puede estar vacía);
+# después de la trama vacía del cliente responde las muestras restantes y una trama vacía, y cierra la conexión. El
+# cliente no envía bloques vacíos, y recibe exactamente una respuesta por bloque más la de las muestras restantes.
+HEADER = struct.Struct("<I")
+
+# Operaciones del servicio:
+#   - "mod": mensaje -> señal modulada (a 4 veces la portadora).
+#   - "demod": señal modulada (a 4 veces la portadora) -> mensaje.
+#   - "modem": mensaje -> modulación -> demodulación -> mensaje (enlace completo sin canal).
+OPERATIONS = ("mod", "demod", "modem")
+
+# Bloques recibidos que pueden esperar a ser procesados. Con la cola llena el servicio deja de leer la conexión, y el
+# control de flujo del transporte detiene al emisor (contrapresión).
+QUEUE_BLOCKS = 8
+
+# Frecuencia de muestreo y tamaño de bloque (100 ms) por defecto del cliente de prueba.
+TEST_RATE = 44100
+TEST_BLOCK = 4410
+
+
+# Clase Stats: Estadísticas de un flujo: latencia de cada bloque, muestras procesadas y tiempo de procesamiento.
+class Stats:
+    # Constructor
+    # Entrada:
+    #           - rate: Número, frecuencia de muestreo de las muestras contadas (para el factor de tiempo real).
+    def __init__(self, rate):
+        self.rate = rate
+        self.latencies = []
+        self.samples = 0
+        self.busy = 0.0
+        self.start = time.perf_counter()
+
+    # Función record: Registra un bloque.
+    # Entradas:
+    #           - samples: Entero, muestras del bloque.
+    #           - latency: Número, segundos desde que llegó el bloque hasta que su resultado se entregó.
+    #           - busy: Número, segundos de procesamiento del bloque.
+    def record(self, samples, latency, busy=0.0):
+        self.samples += samples
+        self.latencies.append(latency)
+        self.busy += busy
+
+    # Función summary: Resumen del flujo.
+    # Salida:
+    #           - Diccionario con bloques, muestras, duración, throughput (muestras/s en tiempo real y de
+    #             procesamiento), factor de tiempo real (throughput de procesamiento / rate) y latencias en ms.
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        # Sin tiempos de procesamiento (en el cliente) la capacidad no se conoce y se usa el throughput.
+        throughput = self.samples / elapsed if elapsed > 0 else np.inf
+        capacity = self.samples / self.busy if self.busy > 0 else None
+        return {"blocks": len(self.latencies), "samples": self.samples, "seconds": elapsed, "throughput": throughput,
+                "capacity": capacity, "realtime": (throughput if capacity is None else capacity) / self.rate,
+                "latency_mean": float(np.mean(latencies)),
+                "latency_p50": float(np.percentile(latencies, 50)), "latency_p95": float(np.percentile(latencies, 95)),
+                "latency_max": float(np.max(latencies))}
+
+
+# Función format_summary: Texto de una línea con el resumen de Stats.summary().
+def format_summary(summary):
+    capacity = "" if summary["capacity"] is None else "procesamiento %.0f muestras/s, " % summary["capacity"]
+    return ("%d bloques, %d muestras en %.2f s: %.0f muestras/s (%s%.1fx tiempo real), latencia media %.1f ms, "
+            "p95 %.1f ms, máxima %.1f ms"
+            % (summary["blocks"], summary["samples"], summary["seconds"], summary["throughput"], capacity,
+               summary["realtime"], summary["latency_mean"], summary["latency_p95"], summary["latency_max"]))
+
+
+# Función read_frame: Lee una trama. Entrega None si la conexión se cerró antes de empezar una trama.
+async def read_frame(reader):
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as error:
+        if error.partial:
+            raise
+        return None
+    return await reader.readexactly(HEADER.unpack(header)[0])
+
+
+# Función write_frame: Escribe una trama y espera a que el transporte la acepte (contrapresión).
+async def write_frame(writer, payload):
+    writer.write(HEADER.pack(len(payload)) + payload)
+    await writer.drain()
+
+
+# Clase _StdioReader: Lector con la interfaz de asyncio.StreamReader sobre la entrada estándar. La lectura bloqueante
+# se hace en un hilo, lo que permite usar archivos y tuberías.
+class _StdioReader:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdin.buffer
+
+    def _read(self, count):
+        data = b""
+        while len(data) < count:
+            chunk = self.stream.read(count - len(data))
+            if not chunk:
+                raise asyncio.IncompleteReadError(data, count)
+            data += chunk
+        return data
+
+    async def readexactly(self, count):
+        return await asyncio.get_running_loop().run_in_executor(None, self._read, count)
+
+
+# Clase _StdioWriter: Escritor con la interfaz de asyncio.StreamWriter sobre la salida estándar.
+class _StdioWriter:
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout.buffer
+        self.buffer = []
+
+    def write(self, data):
+        self.buffer.append(data)
+
+    def _flush(self, data):
+        self.stream.write(data)
+        self.stream.flush()
+
+    async def drain(self):
+        data, self.buffer = b"".join(self.buffer), []
+        await asyncio.get_running_loop().run_in_executor(None, self._flush, data)
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+# Clase _Chain: Etapas encadenadas (la salida de cada una es la entrada de la siguiente).
+class _Chain:
+    def __init__(self, *stages):
+        self.stages = stages
+
+    def process(self, block):
+        for stage in self.stages:
+            block = stage.process(block)
+        return block
+
+    def flush(self):
+        block = None
+        for stage in self.stages:
+            block = stage.flush() if block is None else np.concatenate([stage.process(block), stage.flush()])
+        return block
+
+
+# Clase Modem: Configuración del servicio y de sus sesiones. Cada conexión tiene su propia etapa con estado (ver las
+# clases AMModulator, FMModulator, AMDemodulator y FMDemodulator de redes4).
+class Modem:
+    # Constructor
+    # Entradas:
+    #           - scheme: String, "AM" o "FM".
+    #           - operation: String, una de OPERATIONS.
+    #           - rate: Entero, frecuencia de muestreo del mensaje.
+    #           - freq: Frecuencia de la portadora.
+    #           - percentage: Entero, porcentaje de modulación.
+    #           - dtype: Precisión de trabajo (ver precision), o None para la actual.
+    #           - in_format, out_format: String, formato de las muestras recibidas y enviadas (ver
+    #                                    audio_io.SAMPLE_FORMATS).
+    #           - queue_blocks: Entero, bloques recibidos que pueden esperar a ser procesados.
+    def __init__(self, scheme="AM", operation="modem", rate=TEST_RATE, freq=30000, percentage=100, dtype=None,
+                 in_format="int16", out_format="float32", queue_blocks=QUEUE_BLOCKS):
+        if operation not in OPERATIONS:
+            raise ValueError("Operación no soportada: " + str(operation))
+        if scheme not in ("AM", "FM"):
+            raise ValueError("Modulación no soportada: " + str(scheme))
+        self.scheme = scheme
+        self.operation = operation
+        self.rate = rate
+        self.freq = freq
+        self.percentage = percentage
+        self.dtype = precision.resolve(dtype)
+        self.in_format = in_format
+        self.out_format = out_format
+        self.in_dtype = audio_io.SAMPLE_FORMATS[in_format][0]
+        self.out_dtype = audio_io.SAMPLE_FORMATS[out_format][0]
+        self.queue_blocks = queue_blocks
+
+    # Función input_rate: Frecuencia de muestreo de las muestras recibidas.
+    def input_rate(self):
+        return 4*self.freq if self.operation == "demod" else self.rate
+
+    # Función stage: Nueva etapa con estado para una sesión.
+    def stage(self):
+        if self.scheme == "AM":
+            modulator = redes4.AMModulator(self.rate, self.freq, self.percentage, self.dtype)
+            demodulator = redes4.AMDemodulator(self.rate, self.freq, self.dtype)
+        else:
+            modulator = redes4.FMModulator(self.rate, self.freq, self.percentage, self.dtype)
+            demodulator = redes4.FMDemodulator(self.rate, self.freq, self.percentage, self.dtype)
+        if self.operation == "mod":
+            return modulator
+        if self.operation == "demod":
+            return demodulator
+        return _Chain(modulator, demodulator)
+
+    # Función session: Atiende una conexión hasta que el cliente termina el flujo. La recepción y el procesamiento
+    # corren en paralelo, unidos por una cola acotada; el procesamiento se hace en un hilo para no detener las demás
+    # conexiones.
+    # Entradas:
+    #           - reader, writer: Flujos de asyncio (o de la entrada y salida estándar).
+    # Salida:
+    #           - Stats del flujo (la latencia va desde que se recibe cada bloque hasta que se envía su resultado).
+    async def session(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        stage = self.stage()
+        stats = Stats(self.input_rate())
+        queue = asyncio.Queue(maxsize=self.queue_blocks)
+
+        async def receive():
+            try:
+                while True:
+                    payload = await read_frame(reader)
+                    await queue.put((payload, time.perf_counter()))
+                    if not payload:
+                        return
+            except Exception as error:
+                # Un error de lectura (por ejemplo una trama incompleta) se pasa por la cola; de otro modo el
+                # procesamiento esperaría para siempre un bloque que no llegará.
+                await queue.put((error, time.perf_counter()))
+
+        receiver = asyncio.create_task(receive())
+        try:
+            while True:
+                payload, arrived = await queue.get()
+                if isinstance(payload, Exception):
+                    raise payload
+                if payload is None:
+                    # El cliente se desconectó sin terminar el flujo.
+                    break
+                if not payload:
+                    tail = await loop.run_in_executor(None, stage.flush)
+                    await write_frame(writer, tail.astype(self.out_dtype).tobytes())
+                    await write_frame(writer, b"")
+                    break
+                block = np.frombuffer(payload, dtype=self.in_dtype)
+                start = time.perf_counter()
+                out = await loop.run_in_executor(None, stage.process, block)
+                busy = time.perf_counter() - start
+                await write_frame(writer, out.astype(self.out_dtype).tobytes())
+                stats.record(len(block), time.perf_counter() - arrived, busy)
+        finally:
+            receiver.cancel()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+        return stats
+
+    # Función _handle: Atiende una conexión de un servidor e informa sus estadísticas.
+    async def _handle(self, reader, writer):
+        try:
+            stats = await self.session(reader, writer)
+            print("Sesión terminada: " + format_summary(stats.summary()), file=sys.stderr, flush=True)
+        except (ConnectionError, asyncio.IncompleteReadError) as error:
+            print("Sesión interrumpida: " + repr(error), file=sys.stderr, flush=True)
+
+    # Función start_server: Inicia el servidor en una dirección (ver parse_address).
+    # Salida:
+    #           - asyncio.Server.
+    async def start_server(self, address):
+        kind, target = parse_address(address)
+        if kind == "unix":
+            return await asyncio.start_unix_server(self._handle, target)
+        if kind == "tcp":
+            return await asyncio.start_server(self._handle, *target)
+        raise ValueError("La entrada y salida estándar no admiten un servidor; use serve()")
+
+    # Función serve: Atiende conexiones hasta que se interrumpe el proceso. Con la dirección "-" atiende una sola
+    # sesión sobre la entrada y salida estándar.
+    async def serve(self, address):
+        if parse_address(address)[0] == "stdio":
+            await self._handle(_StdioReader(), _StdioWriter())
+            return
+        server = await self.start_server(address)
+        names = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+        print("Servicio " + self.scheme + " " + self.operation + " escuchando en " + names, file=sys.stderr,
+              flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+# Función parse_address: Interpreta una dirección: "unix:/ruta/al/socket", "tcp:host:puerto", "host:puerto" o "-" (la
+# entrada y salida estándar).
+# Salida:
+#           - Tupla (tipo, destino): ("unix", ruta), ("tcp", (host, puerto)) o ("stdio", None).
+def parse_address(address):
+    if address == "-":
+        return "stdio", None
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    if address.startswith("tcp:"):
+        address = address[len("tcp:"):]
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+# Función _connect: Abre una conexión de cliente.
+async def _connect(address):
+    kind, target = parse_address(address)
+    if kind == "unix":
+        return await asyncio.open_unix_connection(target)
+    if kind == "tcp":
+        return await asyncio.open_connection(*target)
+    return _StdioReader(), _StdioWriter()
+
+
+# Función run_client: Envía una señal al servicio por bloques y recibe el resultado.
+# Entradas:
+#           - address: String, dirección del servicio (ver parse_address).
+#           - samples: Arreglo, señal a enviar (se convierte a in_format).
+#           - rate: Número, frecuencia de muestreo de la señal.
+#           - block_size: Entero, muestras por bloque.
+#           - paced: Booleano, si es True cada bloque se envía en el instante en que estaría disponible en vivo; si es
+#                    False se envía tan rápido como el servicio lo acepte.
+#           - in_format, out_format: String, formatos de las muestras enviadas y recibidas.
+# Salida:
+#           - output: Arreglo con la señal recibida.
+#           - stats: Stats del cliente (latencia desde el envío de cada bloque hasta la llegada de su resultado).
+async def run_client(address, samples, rate, block_size=TEST_BLOCK, paced=True, in_format="int16",
+                     out_format="float32"):
+    reader, writer = await _connect(address)
+    samples = np.asarray(samples).astype(audio_io.SAMPLE_FORMATS[in_format][0])
+    out_dtype = audio_io.SAMPLE_FORMATS[out_format][0]
+    stats = Stats(rate)
+    sent = asyncio.Queue()
+
+    async def send():
+        start = time.perf_counter()
+        for i in range(0, len(samples), block_size):
+            if paced:
+                await asyncio.sleep(max(0.0, start + i / rate - time.perf_counter()))
+            block = samples[i:i + block_size]
+            await sent.put((len(block), time.perf_counter()))
+            await write_frame(writer, block.tobytes())
+        await write_frame(writer, b"")
+
+    sender = asyncio.create_task(send())
+    outputs = []
+    try:
+        # Una respuesta por bloque, la de las muestras restantes y la trama vacía final.
+        for i in range(-(-len(samples) // block_size) + 2):
+            payload = await read_frame(reader)
+            if payload is None:
+                raise ConnectionError("El servicio cerró la conexión antes de terminar")
+            outputs.append(np.frombuffer(payload, dtype=out_dtype))
+            if not sent.empty():
+                count, sent_at = sent.get_nowait()
+                stats.record(count, time.perf_counter() - sent_at)
+        await sender
+    finally:
+        sender.cancel()
+        writer.close()
+    return (np.concatenate(outputs) if outputs else np.zeros(0, dtype=out_dtype)), stats
+
+
+# Función test_signal: Mensaje de prueba de tres tonos en el rango de un audio de 16 bits.
+def test_signal(rate=TEST_RATE, seconds=10):
+    samples = np.arange(int(rate * seconds)) / rate
+    return 10000 * (np.sin(2*np.pi*440*samples) + 0.5*np.sin(2*np.pi*1250*samples + 1)
+                    + 0.25*np.sin(2*np.pi*3100*samples + 2))
+
+
+# Función test_input: Señal de prueba que recibe un servicio. Para "mod" y "modem" es el mensaje de prueba; para
+# "demod" es ese mensaje ya modulado (con redes4.AMModulator o FMModulator) a 4 veces la portadora. Si el servicio
+# recibe enteros, la señal modulada se lleva al rango de 16 bits: la FM tiene amplitud 1 y se perdería al cuantizar.
+# Ninguno de los dos demoduladores necesita la amplitud original (la FM depende solo de la fase y la AM es lineal).
+# Entradas:
+#           - modem: Modem que recibirá la señal.
+#           - seconds: Número, duración del mensaje de prueba.
+# Salida:
+#           - message: Arreglo, mensaje de prueba a modem.rate.
+#           - signal: Arreglo, señal que se envía al servicio, a modem.input_rate().
+def test_input(modem, seconds=10):
+    message = test_signal(modem.rate, seconds)
+    if modem.operation != "demod":
+        return message, message
+    modulator_class = redes4.AMModulator if modem.scheme == "AM" else redes4.FMModulator
+    modulator = modulator_class(modem.rate, modem.freq, modem.percentage, modem.dtype)
+    signal = np.concatenate([modulator.process(message), modulator.flush()])
+    if modem.in_dtype.kind == "i":
+        signal = signal * (30000 / np.max(np.abs(signal)))
+    return message, signal
+
+
+# Función loopback: Prueba el servicio en el mismo proceso: lo inicia en un socket Unix temporal (o en TCP local si el
+# sistema no tiene sockets Unix) y le envía una señal de prueba en tiempo real (ver test_input), en bloques de la misma
+# duración para cualquier operación. El servicio mantiene el tiempo real si procesa más rápido que la frecuencia de
+# muestreo, si la latencia p95 es menor que la duración de un bloque (no se acumula retraso) y si entrega todas las
+# muestras. En las operaciones "demod" y "modem" se verifica además que el mensaje recuperado tenga una correlación
+# alta con el enviado.
+# Entradas:
+#           - modem: Modem a probar.
+#           - seconds: Número, duración del mensaje de prueba.
+#           - block_size: Entero, muestras del mensaje por bloque.
+#           - paced: Booleano, envío en tiempo real (ver run_client).
+# Salida:
+#           - ok: Booleano, si se cumplió el tiempo real.
+#           - report: Diccionario con los resúmenes del servidor y del cliente.
+async def loopback(modem, seconds=10, block_size=TEST_BLOCK, paced=True):
+    message, signal = test_input(modem, seconds)
+    rate = modem.input_rate()
+    block_size = max(1, block_size * rate // modem.rate)
+    results = []
+
+    async def handle(reader, writer):
+        results.append(await modem.session(reader, writer))
+
+    with tempfile.TemporaryDirectory() as directory:
+        if hasattr(socket, "AF_UNIX"):
+            address = "unix:" + os.path.join(directory, "modem.sock")
+            server = await asyncio.start_unix_server(handle, parse_address(address)[1])
+        else:
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            address = "127.0.0.1:" + str(server.sockets[0].getsockname()[1])
+        async with server:
+            output, client = await run_client(address, signal, rate, block_size, paced, modem.in_format,
+                                              modem.out_format)
+            while not results:
+                await asyncio.sleep(0.01)
+    server_summary = results[0].summary()
+    client_summary = client.summary()
+    # La modulación entrega la señal a 4 veces la portadora; la demodulación, el mensaje a modem.rate.
+    expected = -(-len(message) * 4 * modem.freq // modem.rate) if modem.operation == "mod" else len(message)
+    report = {"server": server_summary, "client": client_summary, "samples": len(output), "expected": expected}
+    ok = (server_summary["realtime"] > 1 and client_summary["latency_p95"] < 1000 * block_size / rate
+          and abs(len(output) - expected) <= 1)
+    if modem.operation != "mod":
+        edge = modem.rate // 10
+        n = min(len(output), len(message))
+        report["correlation"] = float(np.corrcoef(output[edge:n - edge], message[edge:n - edge])[0, 1])
+        ok = ok and report["correlation"] > 0.99
+    return ok, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio de modulación y demodulación AM/FM en tiempo real.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="atender conexiones")
+    serve.add_argument("--address", default="127.0.0.1:8765",
+                       help="unix:/ruta, [tcp:]host:puerto o - (entrada y salida estándar)")
+    client = commands.add_parser("client", help="enviar un archivo de audio (o el mensaje de prueba) a un servicio")
+    client.add_argument("--address", default="127.0.0.1:8765")
+    client.add_argument("--file", help="archivo wav a enviar (mono o primer canal)")
+    client.add_argument("--output", help="archivo wav donde se guarda el resultado")
+    test = commands.add_parser("loopback", help="probar el servicio en tiempo real en este proceso")
+    test.add_argument("--seconds", type=float, default=10)
+    for command in (serve, client, test):
+        command.add_argument("--scheme", choices=("AM", "FM"), default="AM")
+        command.add_argument("--operation", choices=OPERATIONS, default="modem")
+        command.add_argument("--rate", type=int, default=TEST_RATE, help="frecuencia de muestreo del mensaje")
+        command.add_argument("--freq", type=int, default=30000, help="frecuencia de la portadora")
+        command.add_argument("--percentage", type=int, default=100)
+        command.add_argument("--dtype", choices=precision.DTYPES, default="float64")
+        command.add_argument("--in-format", choices=list(audio_io.SAMPLE_FORMATS), default="int16")
+        command.add_argument("--out-format", choices=list(audio_io.SAMPLE_FORMATS), default="float32")
+    for command in (client, test):
+        command.add_argument("--block", type=int, default=TEST_BLOCK, help="muestras por bloque")
+        command.add_argument("--unpaced", action="store_true", help="enviar sin esperar el tiempo real")
+    args = parser.parse_args(argv)
+    modem = Modem(args.scheme, args.operation, args.rate, args.freq, args.percentage, args.dtype, args.in_format,
+                  args.out_format)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(modem.serve(args.address))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if args.command == "client":
+        if args.file:
+            rate, signal = redes4.open_audio(args.file)
+            if rate != modem.input_rate():
+                print("El archivo tiene %d Hz y el servicio espera %d Hz (ver --rate)" % (rate, modem.input_rate()),
+                      file=sys.stderr)
+                return 2
+        else:
+            rate, signal = modem.input_rate(), test_input(modem)[1]
+        output, stats = asyncio.run(run_client(args.address, signal, rate, args.block, not args.unpaced,
+                                               args.in_format, args.out_format))
+        print("Cliente: " + format_summary(stats.summary()), file=sys.stderr)
+        if args.output:
+            out_rate = 4*modem.freq if modem.operation == "mod" else modem.rate
+            audio_io.write_audio(args.output, out_rate, [output], args.out_format)
+        return 0
+    ok, report = asyncio.run(loopback(modem, args.seconds, args.block, not args.unpaced))
+    print("Servidor: " + format_summary(report["server"]))
+    print("Cliente:  " + format_summary(report["client"]))
+    print("Muestras recibidas: %d de %d" % (report["samples"], report["expected"]))
+    if "correlation" in report:
+        print("Correlación con el mensaje: %.5f" % report["correlation"])
+    print("Tiempo real: " + ("OK" if ok else "NO"))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
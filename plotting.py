@@ -0,0 +1,176 @@
+from concurrent.futures import ThreadPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import numpy as np
+import os
+import profiling
+
+# Ancho en pixeles de las figuras (10.24 pulgadas a 100 dpi). Las series más largas se reducen a este número de
+# intervalos antes de graficarse.
+PIXEL_WIDTH = 1024
+
+# Alto en pixeles de las figuras (7.20 pulgadas a 100 dpi), usado para reducir las filas de matrices como los
+# espectrogramas.
+PIXEL_HEIGHT = 720
+
+# Modos de generación de gráficos:
+#   - "sync": se dibujan en el momento, en el mismo hilo.
+#   - "background": se dibujan en un hilo aparte, sin detener el procesamiento de la señal.
+#   - "deferred": se guardan y se dibujan recién al llamar a flush().
+#   - "off": no se generan.
+MODES = ("sync", "background", "deferred", "off")
+
+_mode = "sync"
+_executor = None
+_pending = []
+
+
+# Función set_mode: Cambia el modo de generación de gráficos. Antes de cambiarlo se terminan los gráficos pendientes.
+# Entrada:
+#           - mode: String, uno de MODES.
+def set_mode(mode):
+    global _mode
+    if mode not in MODES:
+        raise ValueError("Modo de gráficos no soportado: " + str(mode))
+    flush()
+    _mode = mode
+
+
+# Función get_mode: Modo de generación de gráficos actual.
+def get_mode():
+    return _mode
+
+
+# Función enabled: Indica si se generan gráficos. Permite omitir los cálculos que solo sirven para graficar.
+def enabled():
+    return _mode != "off"
+
+
+# Función submit: Agrega un gráfico según el modo actual.
+# Entradas:
+#           - function: Función que dibuja y guarda el gráfico.
+#           - args: Argumentos de la función (ya reducidos, para que sean livianos).
+def submit(function, *args, **kwargs):
+    global _executor
+    if _mode == "off":
+        return
+    # Si la instrumentación está activa, el dibujo se mide como parte de la etapa que lo pidió (ver profiling).
+    function = profiling.deferred(function)
+    if _mode == "sync":
+        function(*args, **kwargs)
+    elif _mode == "background":
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1)
+        _pending.append(_executor.submit(function, *args, **kwargs))
+    else:
+        _pending.append((function, args, kwargs))
+
+
+# Función flush: Espera a que terminen los gráficos en segundo plano y dibuja los diferidos.
+def flush():
+    while _pending:
+        item = _pending.pop(0)
+        if isinstance(item, tuple):
+            function, args, kwargs = item
+            function(*args, **kwargs)
+        else:
+            item.result()
+
+
+# Función _reset_after_fork: En un proceso creado con fork no existe el hilo de los gráficos en segundo plano del
+# proceso padre, por lo que se descartan el ejecutor y los gráficos pendientes heredados.
+def _reset_after_fork():
+    global _executor
+    _executor = None
+    _pending.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# Función envelope: Reduce una serie larga a su envolvente mínimo/máximo por intervalo, con dos puntos por intervalo.
+# Al dibujarla con la resolución de la figura se ve igual que la serie completa.
+# Entradas:
+#           - x: Arreglo, eje x (monótono).
+#           - y: Arreglo, valores.
+#           - bins: Entero, número de intervalos (normalmente el ancho en pixeles).
+# Salida:
+#           - Arreglos x e y reducidos (o los originales si ya son cortos).
+def envelope(x, y, bins=PIXEL_WIDTH):
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(y) <= 2 * bins:
+        return x, y
+    size = -(-len(y) // bins)
+    count = -(-len(y) // size)
+    # Se completa el último intervalo repitiendo la última muestra, para poder ordenar la serie en una matriz.
+    blocks = np.concatenate([y, np.repeat(y[-1:], count * size - len(y))]).reshape(count, size)
+    rows = np.arange(count)
+    low = blocks.argmin(axis=1)
+    high = blocks.argmax(axis=1)
+    # En cada intervalo se dibuja primero el extremo que aparece antes, para conservar la forma de la curva.
+    first = np.minimum(low, high)
+    second = np.maximum(low, high)
+    index = np.minimum(np.stack([first, second], axis=1) + (rows * size)[:, None], len(y) - 1).ravel()
+    return x[index], y[index]
+
+
+# Función visible: Recorta una serie al intervalo visible del eje x, dejando una muestra a cada lado.
+def visible(x, y, x_limit):
+    if len(x_limit) != 2:
+        return x, y
+    start = max(np.searchsorted(x, x_limit[0]) - 1, 0)
+    end = np.searchsorted(x, x_limit[1], side="right") + 1
+    return x[start:end], y[start:end]
+
+
+# Función new_figure: Crea una figura sin pasar por pyplot, por lo que puede dibujarse desde cualquier hilo y se libera
+# al terminar (no se acumulan figuras abiertas).
+def new_figure(figsize=(10.24, 7.20), dpi=100):
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+    return figure
+
+
+# Función save_figure: Guarda una figura en la carpeta indicada por la ruta, creándola si no existe.
+def save_figure(figure, path, **kwargs):
+    dir_name = os.path.dirname(path)
+    if dir_name:
+        os.makedirs(dir_name, exist_ok=True)
+    figure.savefig(path, **kwargs)
+
+
+# Función render_signal: Dibuja y guarda una señal (ver redes4.plot_signal).
+def render_signal(path, time, data, name, x_axis, y_axis, x_limit):
+    figure = new_figure()
+    axes = figure.add_subplot(111)
+    if len(x_limit) == 2:
+        axes.set_xlim(x_limit[0], x_limit[1])
+    axes.plot(time, data)
+    axes.grid()
+    axes.set_title(name)
+    axes.set_xlabel(x_axis)
+    axes.set_ylabel(y_axis)
+    figure.tight_layout()
+    save_figure(figure, path, bbox_inches='tight', dpi=100)
+
+
+# Función render_spectrums: Dibuja y guarda los espectros de moduladora, portadora y modulada (ver
+# redes4.plot_spectrums).
+# Entradas:
+#           - path: String, ruta del archivo.
+#           - spectrums: Lista de tuplas (xf, |F(w)|) de la moduladora, portadora y modulada.
+def render_spectrums(path, spectrums):
+    figure = new_figure()
+    titles = ["FT de la moduladora", "FT de la portadora", "FT de la señal modulada"]
+    styles = ["-", "r", "g"]
+    for position, title, style, (xf, ft) in zip((221, 222, 223), titles, styles, spectrums):
+        axes = figure.add_subplot(position)
+        axes.set_title(title)
+        axes.set_ylabel("|F(w)|")
+        axes.set_xlabel("Frecuencia[Hz]")
+        axes.grid()
+        axes.plot(xf, ft, style)
+    figure.tight_layout()
+    save_figure(figure, path, bbox_inches='tight', dpi=100)
@@ -0,0 +1,54 @@
+import numpy as np
+
+# Precisiones soportadas para las señales del procesamiento:
+#   - "float64": doble precisión (por defecto), complejos en complex128.
+#   - "float32": precisión simple, complejos en complex64. Usa la mitad de memoria y de ancho de banda.
+# Las operaciones que acumulan error con el largo de la señal (ejes de tiempo, fase de la portadora e integral del
+# mensaje en FM) se calculan siempre en doble precisión y solo el resultado se guarda en la precisión elegida.
+DTYPES = ("float64", "float32")
+
+_dtype = np.dtype("float64")
+
+
+# Función resolve: Tipo de numpy de una precisión.
+# Entrada:
+#           - dtype: String o tipo de numpy, una de DTYPES. Con None se usa la precisión actual (ver set_dtype).
+# Salida:
+#           - np.dtype real.
+def resolve(dtype=None):
+    if dtype is None:
+        return _dtype
+    if np.dtype(dtype).name not in DTYPES:
+        raise ValueError("Precisión no soportada: " + str(dtype))
+    return np.dtype(dtype)
+
+
+# Función set_dtype: Cambia la precisión usada por defecto en todo el procesamiento.
+# Entrada:
+#           - dtype: String o tipo de numpy, una de DTYPES.
+def set_dtype(dtype):
+    global _dtype
+    _dtype = resolve(dtype)
+
+
+# Función get_dtype: Precisión actual (np.dtype real).
+def get_dtype():
+    return _dtype
+
+
+# Función complex_dtype: Tipo complejo de la misma precisión.
+def complex_dtype(dtype=None):
+    return np.result_type(resolve(dtype), np.complex64)
+
+
+# Función working: Convierte un arreglo a la precisión de trabajo (real o compleja según el arreglo). No copia si ya
+# tiene ese tipo.
+# Entradas:
+#           - x: Arreglo (enteros, reales o complejos).
+#           - dtype: Precisión, o None para la actual.
+# Salida:
+#           - Arreglo en la precisión indicada.
+def working(x, dtype=None):
+    x = np.asarray(x)
+    target = complex_dtype(dtype) if np.iscomplexobj(x) else resolve(dtype)
+    return x.astype(target, copy=False)
@@ -0,0 +1,233 @@
+import csv
+import functools
+import json
+import threading
+import time
+import tracemalloc
+import numpy as np
+
+# Campos de cada registro, en el orden del reporte CSV.
+FIELDS = ("stage", "wall", "cpu", "peak_bytes", "arrays")
+
+_enabled = False
+_memory = False
+_records = []
+_lock = threading.Lock()
+# Pila de etapas abiertas, una por hilo (los gráficos en segundo plano se registran desde otro hilo).
+_local = threading.local()
+
+
+# Función enable: Activa la instrumentación. Mientras está desactivada (por defecto), stage() y profiled() no miden
+# nada y su costo es el de una comparación.
+# Entrada:
+#           - memory: Booleano, si es True se mide además el pico de memoria de cada etapa con tracemalloc (que hace más
+#                     lento el programa mientras está activo). Con gráficos en segundo plano los picos de etapas que se
+#                     ejecutan al mismo tiempo en distintos hilos no se pueden separar.
+def enable(memory=True):
+    global _enabled, _memory
+    _enabled = True
+    _memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+# Función disable: Desactiva la instrumentación (los registros se conservan hasta llamar a clear()).
+def disable():
+    global _enabled, _memory
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _enabled = False
+    _memory = False
+
+
+# Función enabled: Indica si la instrumentación está activa.
+def enabled():
+    return _enabled
+
+
+# Función records: Copia de los registros acumulados (una lista de diccionarios con los campos de FIELDS).
+def records():
+    with _lock:
+        return list(_records)
+
+
+# Función clear: Borra los registros acumulados.
+def clear():
+    with _lock:
+        _records.clear()
+
+
+# Función extend: Agrega registros medidos en otro proceso (por ejemplo en los procesos del barrido paralelo).
+def extend(new_records):
+    with _lock:
+        _records.extend(new_records)
+
+
+# Función _stack: Pila de etapas abiertas del hilo actual.
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+# Función _describe: Forma, tipo y tamaño en bytes de un arreglo (o de los datos de un par [frecuencia, datos]).
+def _describe(value):
+    if isinstance(value, (list, tuple)) and len(value) == 2 and isinstance(value[1], np.ndarray):
+        value = value[1]
+    if isinstance(value, np.ndarray):
+        return {"shape": list(value.shape), "dtype": value.dtype.name, "bytes": int(value.nbytes)}
+    return None
+
+
+# Clase Stage: Etapa medida. Se usa con "with" (ver stage()).
+class Stage:
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.sizes = {}
+
+    # Función arrays: Registra el tamaño de los arreglos de la etapa (los argumentos que no son arreglos se ignoran).
+    def arrays(self, **named):
+        for key, value in named.items():
+            description = _describe(value)
+            if description is not None:
+                self.sizes[key] = description
+
+    def __enter__(self):
+        stack = _stack()
+        if self.parent is None:
+            self.parent = stack[-1].path if stack else ""
+        self.path = self.parent + "/" + self.name if self.parent else self.name
+        if _memory:
+            # El pico acumulado hasta ahora se traspasa a la etapa que contiene a esta antes de reiniciarlo.
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].running_peak = max(stack[-1].running_peak, peak)
+            tracemalloc.reset_peak()
+            self.start_memory = current
+            self.running_peak = current
+        stack.append(self)
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        return self
+
+    def __exit__(self, *args):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+        stack = _stack()
+        stack.pop()
+        peak_bytes = None
+        if _memory:
+            peak = max(self.running_peak, tracemalloc.get_traced_memory()[1])
+            peak_bytes = peak - self.start_memory
+            if stack:
+                stack[-1].running_peak = max(stack[-1].running_peak, peak)
+        record = {"stage": self.path, "wall": wall, "cpu": cpu, "peak_bytes": peak_bytes, "arrays": self.sizes}
+        with _lock:
+            _records.append(record)
+        return False
+
+
+# Clase _NullStage: Etapa vacía que se entrega cuando la instrumentación está desactivada.
+class _NullStage:
+    def arrays(self, **named):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+# Función stage: Mide una etapa: tiempo real, tiempo de CPU del proceso, pico de memoria (si se activó) y tamaños de
+# arreglos. Las etapas pueden anidarse; el nombre registrado es la ruta completa (por ejemplo "AM 15%/am_modulation").
+# Entrada:
+#           - name: String, nombre de la etapa.
+# Salida:
+#           - Objeto para usar con "with", con el método arrays(nombre=arreglo, ...).
+def stage(name):
+    if not _enabled:
+        return _NULL_STAGE
+    return Stage(name)
+
+
+# Función current_path: Ruta de la etapa abierta en el hilo actual ("" si no hay ninguna).
+def current_path():
+    stack = _stack()
+    return stack[-1].path if stack else ""
+
+
+# Función profiled: Decorador que mide cada llamada a una función como una etapa, registrando el tamaño de los
+# arreglos que recibe y entrega. Desactivado, solo agrega una comparación a la llamada.
+# Entrada:
+#           - name: String opcional, nombre de la etapa (por defecto el nombre de la función).
+def profiled(name=None):
+    def decorator(function):
+        stage_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with Stage(stage_name) as measured:
+                measured.arrays(**{"arg" + str(i): value for i, value in enumerate(args)})
+                result = function(*args, **kwargs)
+                values = result if isinstance(result, tuple) else (result,)
+                measured.arrays(**{"out" + str(i): value for i, value in enumerate(values)})
+            return result
+        return wrapper
+    return decorator
+
+
+# Función deferred: Prepara una función que se ejecutará después o en otro hilo (por ejemplo un gráfico en segundo
+# plano) para que se mida como etapa hija de la etapa abierta en este momento.
+def deferred(function, name=None):
+    if not _enabled:
+        return function
+    parent = current_path()
+    stage_name = name or function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with Stage(stage_name, parent):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+# Función summary: Totales por etapa (sin el prefijo de la etapa de nivel superior), útil para comparar versiones.
+# Salida:
+#           - Diccionario {etapa: {"calls", "wall", "cpu", "peak_bytes"}}, con tiempos sumados y el mayor pico.
+def summary():
+    totals = {}
+    for record in records():
+        key = record["stage"].split("/", 1)[-1]
+        total = totals.setdefault(key, {"calls": 0, "wall": 0.0, "cpu": 0.0, "peak_bytes": None})
+        total["calls"] += 1
+        total["wall"] += record["wall"]
+        total["cpu"] += record["cpu"]
+        if record["peak_bytes"] is not None:
+            total["peak_bytes"] = max(total["peak_bytes"] or 0, record["peak_bytes"])
+    return totals
+
+
+# Función write_report: Escribe los registros en un archivo JSON o CSV (según la extensión). El JSON incluye además los
+# totales por etapa (ver summary) y los metadatos entregados.
+# Entradas:
+#           - path: String, nombre del archivo (.json o .csv).
+#           - metadata: Diccionario opcional con datos de la ejecución (parámetros, versión, etc.).
+def write_report(path, metadata=None):
+    data = records()
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+            for record in data:
+                writer.writerow(dict(record, arrays=json.dumps(record["arrays"], sort_keys=True)))
+    else:
+        with open(path, "w") as file:
+            json.dump({"metadata": metadata or {}, "records": data, "summary": summary()}, file, indent=2,
+                      sort_keys=True)
@@ -1,34 +1,139 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from scipy.io import wavfile
 from scipy.integrate import cumtrapz
-import scipy.fftpack as fftp
-import matplotlib.pyplot as plt
+import scipy.signal as sg
 import numpy as np
+import functools
 import os
+import audio_io
+import ddc
 import lab2lib
+import plotting
+import precision
+import profiling
+import resampler
+import spectrum
 
 # Función open_audio: Se encarga de abrir un archivo de audio en formato wav.
 # Entrada:
 #           - audio: String, nombre del archivo de audio con extensión incluida.
+#           - channel: Canal que se entrega (por defecto el primero). None entrega todos los canales y "mix" el promedio
+#                      de ellos (ver audio_io.read_audio).
+#           - mmap: Booleano, si es True los datos se mapean desde el disco en vez de cargarse completos.
 # Salida:
 #           - Arreglo, en su primera posición se ubica un entero que indica la frecuencia de muestreo del audio
 #             mientras que en su segunda posición se encuentra otro arreglo que representa el audio abierto.
-def open_audio(audio):
-    rate, audio = wavfile.read(audio)
-    if isinstance(audio[1], np.ndarray):
-        audio = audio[:, 0]
-    return [rate, audio]
+def open_audio(audio, channel=0, mmap=False):
+    return audio_io.read_audio(audio, channel, mmap)
 
 # Función save_audio: Se encarga de guardar un archivo de audio en formato wav.
 # Entrada:
 #           - name: String, nombre con el que se guarda el archivo de audio
 #           - rate: Entero, frecuencia de muestreo del archivo de audio.
 #           - data: Arreglo, contiene los datos que componen el archivo de audio
+#           - sample_format: String opcional, "int16", "float32" o "float64". Si no se indica, se guarda con el tipo
+#                            de los datos.
 # Salida:
 #           - Archivo de audio generado en la carpeta "/audio/" ubicada en el mismo directorio que el código.
-def save_audio(name, rate, data):
+@profiling.profiled()
+def save_audio(name, rate, data, sample_format=None):
     dir_name = "./audio/"
     os.makedirs(dir_name, exist_ok=True)
-    wavfile.write(dir_name + name, rate, data)
+    if sample_format is None:
+        wavfile.write(dir_name + name, rate, data)
+    else:
+        audio_io.write_audio(dir_name + name, rate, data, sample_format)
+
+
+# Clase ModulationContext: Reúne los arreglos que comparten todas las modulaciones de un mismo mensaje sobre una misma
+# portadora (muestras de la portadora, portadora, mensaje a la frecuencia de la portadora e integral del mensaje). Cada
+# arreglo se calcula la primera vez que se usa y queda guardado, por lo que solo cambia el índice entre una modulación y
+# otra. Los métodos reciben una lista de porcentajes y entregan una fila por porcentaje; AM y su demodulación son
+# lineales en el índice, así que un barrido de muchos porcentajes cuesta casi lo mismo que uno solo.
+# Las señales se guardan en la precisión del contexto; el eje de tiempo, la fase y la integral del mensaje se calculan
+# en doble precisión (ver precision).
+class ModulationContext:
+    # Constructor
+    # Entradas:
+    #           - data: Arreglo, [frecuencia de muestreo, datos del mensaje].
+    #           - freq: Frecuencia de la señal portadora.
+    #           - dtype: Precisión de las señales ("float64" o "float32"), o None para la actual.
+    def __init__(self, data, freq, dtype=None):
+        self.data = data
+        self.freq = freq
+        self.carrier_rate = 4*freq
+        self.dtype = precision.resolve(dtype)
+
+    @functools.cached_property
+    def samples_carrier(self):
+        # Se generan las muestras de la portadora, a una frecuencia de muestreo de 4 veces la frecuencia de la portadora.
+        return np.arange(0, len(self.data[1])/self.data[0], 1/self.carrier_rate)
+
+    @functools.cached_property
+    def carrier(self):
+        return np.cos(2 * np.pi * self.freq * self.samples_carrier).astype(self.dtype, copy=False)
+
+    @functools.cached_property
+    def information(self):
+        # Mensaje llevado a la frecuencia de muestreo de la portadora.
+        return resampler.resample(self.data[1], self.data[0], self.carrier_rate, len(self.samples_carrier),
+                                  self.dtype)
+
+    @functools.cached_property
+    def integral_info(self):
+        # Integral acumulativa del mensaje, usada por la modulación FM (en doble precisión, por ser una suma acumulada).
+        return cumtrapz(self.information, self.samples_carrier, initial=0)
+
+    @functools.cached_property
+    def _am_parts(self):
+        # Componentes de la señal AM: modulada = carrier + m*information*carrier.
+        return np.stack([self.carrier, self.information*self.carrier])
+
+    @functools.cached_property
+    def _demod_parts(self):
+        # Componentes de la demodulación AM (producto con la portadora y filtro paso bajo), ya filtradas.
+        low_pass = lab2lib.Filter(self.carrier_rate, self.freq/2, dtype=self.dtype)
+        return low_pass.process(self._am_parts*self.carrier)
+
+    @functools.cached_property
+    def _demod_small_parts(self):
+        # A la frecuencia del mensaje se usa el conversor de bajada, sin pasar por la señal filtrada completa.
+        return ddc.downconvert(self._am_parts, self.carrier_rate, self.freq, self.data[0], len(self.data[1]),
+                               self.dtype)
+
+    # Función _combine: Evalúa parts[0] + m*parts[1] para cada índice, como una sola operación vectorizada.
+    @staticmethod
+    def _combine(parts, percentages):
+        m = np.asarray(percentages, dtype=parts.dtype)[:, None]/100
+        return parts[0] + m*parts[1]
+
+    # Función am: Señales moduladas en amplitud, a la frecuencia de la portadora.
+    # Entrada:
+    #           - percentages: Lista de enteros, porcentajes de modulación.
+    # Salida:
+    #           - Arreglo 2D, una fila por porcentaje.
+    def am(self, percentages):
+        return self._combine(self._am_parts, percentages)
+
+    # Función fm: Señales moduladas en frecuencia, a la frecuencia de la portadora.
+    # Entrada:
+    #           - percentages: Lista de enteros, porcentajes de modulación.
+    # Salida:
+    #           - Arreglo 2D, una fila por porcentaje.
+    def fm(self, percentages):
+        m = np.asarray(percentages, dtype=float)[:, None]/100
+        mod_signal = np.cos(2*np.pi*self.freq*self.samples_carrier+m*self.integral_info)
+        return mod_signal.astype(self.dtype, copy=False)
+
+    # Función am_demodulated: Señales AM demoduladas (producto con la portadora y filtro paso bajo).
+    # Entradas:
+    #           - percentages: Lista de enteros, porcentajes de modulación.
+    #           - small: Booleano, si es True se entregan a la frecuencia de muestreo del mensaje.
+    # Salida:
+    #           - Arreglo 2D, una fila por porcentaje.
+    def am_demodulated(self, percentages, small=False):
+        return self._combine(self._demod_small_parts if small else self._demod_parts, percentages)
 
 
 # Función am_modulation: Recibe un mensaje y lo emplea para modular la amplitud de una señal portadora.
@@ -37,28 +142,33 @@ def save_audio(name, rate, data):
 #                   de la señal moduladora y en su segunda posición un arreglo con los datos del mensaje.
 #           - percentage: Entero, porcentaje de modulación.
 #           - freq: Frecuencia de la señal portadora.
+#           - context: ModulationContext opcional, para reutilizar portadora y mensaje entre varios porcentajes.
 # Salida:
 #           - mod_signal: arreglos, corresponde a la señal modulada
 #           - samples_carrier: muestras empleadas para generar la señal portadora.
-def am_modulation(data, percentage, freq):
-    signal_time = len(data[1])/data[0]
+@profiling.profiled()
+def am_modulation(data, percentage, freq, context=None):
+    if context is None:
+        context = ModulationContext(data, freq)
 
-    # Se generan las muestras de la portadora, a una frecuencia de muestreo de 4 veces la frecuencia a la que se modula.
-    samples_carrier = np.arange(0, signal_time, 1/(4*freq))
-    carrier = np.cos(2 * np.pi * freq * samples_carrier)
-
-    # Se generan las muestras iniciales del mensaje, las que se emplean para interpolar posteriormente.
-    samples_signal = np.linspace(0, signal_time, len(data[1]))
-    # Interpolación del mensaje para igualar el número de muestras con la portadora.
-    information = np.interp(samples_carrier, samples_signal, data[1])
-    m = percentage/100
+    # Muestras de la portadora (4 veces su frecuencia), portadora y mensaje llevado a esa frecuencia de muestreo
+    # (filtro polifásico). Con un contexto compartido solo se calculan en el primer trabajo.
+    with profiling.stage("carrier") as stage:
+        samples_carrier = context.samples_carrier
+        carrier = context.carrier
+        stage.arrays(samples_carrier=samples_carrier, carrier=carrier)
+    with profiling.stage("resample") as stage:
+        information = context.information
+        stage.arrays(information=information)
 
     # Cálculo de la señal modulada.
-    mod_signal = (1+m*information)*carrier
+    with profiling.stage("modulate") as stage:
+        mod_signal = context.am([percentage])[0]
+        stage.arrays(mod_signal=mod_signal)
 
-    # Se interpola la señal modulada para tener una frecuencia de muestreo menor, soportada por wavfile.write()
-    mod_signal_small = np.interp(samples_signal, samples_carrier, mod_signal)
-    save_audio("audio_am_" + str(percentage) + ".wav", data[0], mod_signal_small/3000)
+    # La señal modulada se guarda a su frecuencia de muestreo (4 veces la portadora). A la frecuencia del mensaje no
+    # cabe: el filtro que evita el repliegue eliminaría toda la banda modulada y el archivo quedaría en silencio.
+    save_audio("audio_am_" + str(percentage) + ".wav", 4*freq, mod_signal/3000)
 
     # Generación de gráficos (modulada y espectros de frecuencia)
     plot_signal(samples_carrier, mod_signal, "Modulación AM "+str(percentage)+"%", "T[s]", "Amplitud[dB]")
@@ -72,28 +182,33 @@ def am_modulation(data, percentage, freq):
 #                   de la señal moduladora y en su segunda posición un arreglo con los datos del mensaje.
 #           - percentage: Entero, porcentaje de modulación.
 #           - freq: Frecuencia de la señal portadora.
+#           - context: ModulationContext opcional, para reutilizar portadora, mensaje e integral entre porcentajes.
 # Salida:
 #           - mod_signal: arreglos, corresponde a la señal modulada
 #           - samples_carrier: muestras empleadas para generar la señal portadora.
-def fm_modulation(data, percentage, freq):
-    signal_time = len(data[1]) / data[0]
-    # Se generan las muestras de la portadora, a una frecuencia de muestreo de 4 veces la frecuencia a la que se modula.
-    samples_carrier = np.arange(0, signal_time, 1 / (4 * freq))
-    # Se general las muestras del mensaje original, las que luego son empleadas para interpolar el audio original.
-    samples_signal = np.linspace(0, signal_time, len(data[1]))
-    carrier = np.cos(2 * np.pi * freq * samples_carrier)
-
-    # Interpolación de moduladora para tener el mismo numero de muestras que la portadora
-    information = np.interp(samples_carrier, samples_signal, data[1])
-    m = percentage/100
+@profiling.profiled()
+def fm_modulation(data, percentage, freq, context=None):
+    if context is None:
+        context = ModulationContext(data, freq)
+
+    # Muestras de la portadora, portadora y moduladora con el mismo numero de muestras que la portadora
+    with profiling.stage("carrier") as stage:
+        samples_carrier = context.samples_carrier
+        carrier = context.carrier
+        stage.arrays(samples_carrier=samples_carrier, carrier=carrier)
+    with profiling.stage("resample") as stage:
+        information = context.information
+        stage.arrays(information=information)
 
-    # Integral acumulativa del mensaje, esta se emplea posteriormente para calcular la señal modulada.
-    integral_info = cumtrapz(information, samples_carrier, initial=0)
-    mod_signal = np.cos(2*np.pi*freq*samples_carrier+m*integral_info)
+    # La señal modulada usa la integral acumulativa del mensaje (calculada una vez en el contexto).
+    with profiling.stage("cumtrapz") as stage:
+        stage.arrays(integral_info=context.integral_info)
+    with profiling.stage("modulate") as stage:
+        mod_signal = context.fm([percentage])[0]
+        stage.arrays(mod_signal=mod_signal)
 
-    # Interpolación de la señal para tener una frecuencia de muestreo soportada por wavfile.write()
-    mod_signal_small = np.interp(samples_signal, samples_carrier, mod_signal)
-    save_audio("audio_fm_"+str(percentage)+".wav", data[0], mod_signal_small/10)
+    # Igual que en am_modulation, la señal se guarda a 4 veces la portadora, frecuencia a la que cabe sin repliegue.
+    save_audio("audio_fm_"+str(percentage)+".wav", 4*freq, mod_signal/10)
 
     # Generación de gráficos (modulada y espectros de frecuencia)
     plot_signal(samples_carrier, mod_signal, "Modulación FM "+str(percentage)+"%", "T[s]"
@@ -103,42 +218,151 @@ def fm_modulation(data, percentage, freq):
 
 
 # Función am_demodulation: Se encarga de demodular una señal que ya ha sido modulada en su amplitud para obtener el
-# mensaje que esta porta.
+# mensaje que esta porta. El producto con la portadora, el filtro paso bajo y el cambio a la frecuencia de muestreo del
+# mensaje se hacen en una sola etapa (conversor digital de bajada, ver ddc), que solo calcula las muestras que se
+# conservan. La señal demodulada a 4 veces la portadora solo se calcula si se generan los gráficos.
 # Entradas:
 #           - modulated: Arreglo, corresponde a la señal modulada.
 #           - samples_carrier: Arreglo, corresponde a las muestras que se emplearon para crear la señal portadora.
 #           - freq: Entero, corresponde a la frecuencia de la señal portadora.
 #           - percentage: Entero, corresponde al porcentaje de modulación de la señal portadora.
-#           - original_freq: Entero, corresponde a la frecuencia de muestreo de la señal original.
+#           - meta_data: Arreglo, [frecuencia de muestreo de la señal original, número de muestras de la señal original].
+#           - context: ModulationContext opcional, del que se reutiliza la portadora para los gráficos.
 # Salida:
-#           - demod_signal: Arreglo, corresponde a la señal demodulada.
-def am_demodulation(modulated, samples_carrier, freq, percentage, meta_data):
-    # Creación de una portadora, que se multiplica con la modulada para obtener la señal original
-    carrier = np.cos(2 * np.pi * freq * samples_carrier)
-    demod_signal = modulated*carrier
-
-    ft_am_0 = np.abs(fftp.fftshift(fftp.fft(demod_signal)))
-    # Se aplica un filtro paso bajo (diseñado en el lab 2) sobre la señal demodulada para obtener la señal original.
-    demod_signal = lab2lib.filter_signal([4*freq, demod_signal], freq/2)
-
-    # Se emplea fftshift sobre fftfreq para obtener un eje x en el dominio de las frecuencias.
-    xf = fftp.fftshift(fftp.fftfreq(len(modulated), samples_carrier[2]-samples_carrier[1]))
-    ft_am_1 = np.abs(fftp.fftshift(fftp.fft(demod_signal[1])))
-
-    signal_time = len(demod_signal[1])/demod_signal[0]
-    samples_signal = np.linspace(0, signal_time, meta_data[1])
-    # Se interpola la señal demodulada, para tener una frecuencia de muestreo soportada por wavfile.write()
-    demod_signal_small = np.interp(samples_signal, samples_carrier, demod_signal[1])
+#           - demod_signal: Arreglo, [frecuencia de muestreo del mensaje, señal demodulada].
+@profiling.profiled()
+def am_demodulation(modulated, samples_carrier, freq, percentage, meta_data, context=None):
+    with profiling.stage("ddc") as stage:
+        demod_signal_small = ddc.downconvert(modulated, 4*freq, freq, meta_data[0], meta_data[1])
+        stage.arrays(demod_signal_small=demod_signal_small)
     save_audio("audio_demod_"+str(percentage)+".wav", meta_data[0], demod_signal_small/2000)
 
-    # Se grafica la señal demodulada y su transformada de fourier
+    # Los gráficos muestran la señal a la frecuencia de la portadora (producto con la portadora y filtro paso bajo
+    # diseñado en el lab 2), por lo que solo se calcula si están activados.
+    if plotting.enabled():
+        if context is None:
+            carrier = precision.working(np.cos(2 * np.pi * freq * samples_carrier))
+        else:
+            carrier = context.carrier
+        with profiling.stage("filter") as stage:
+            product = modulated*carrier
+            filtered = lab2lib.Filter(4*freq, freq/2).process(product)
+            stage.arrays(product=product, filtered=filtered)
+        with profiling.stage("fft"):
+            xf, ft_am_0 = spectrum.centered_magnitude(product, 4*freq)
+            # Espectro centrado (frecuencias negativas y positivas) de la señal filtrada.
+            xf, ft_am_1 = spectrum.centered_magnitude(filtered, 4*freq)
+
+        # Se grafica la señal demodulada y su transformada de fourier
+        plot_signal(np.linspace(0, len(filtered)/(4*freq), len(filtered)), filtered,
+                    "Señal demodulada "+str(percentage)+"%", "T[s]", "Amplitud[dB]")
+        plot_signal(xf, ft_am_0, "TF Demodulación AM (sin filtro)" + str(percentage)+ "%", "Frecuencia[Hz]",
+                    "|F(w)|")
+        plot_signal(xf, ft_am_1, "TF Demodulación AM (con filtro)" + str(percentage)+ "%", "Frecuencia[Hz]",
+                    "|F(w)|")
+    return [meta_data[0], demod_signal_small]
+
+
+# Número de coeficientes del filtro FIR de fase lineal usado por el discriminador FM. El corte es freq/2, que a una
+# frecuencia de muestreo de 4*freq siempre corresponde a un cuarto de la frecuencia de Nyquist.
+FM_FILTER_TAPS = 31
+
+
+# Función fm_demodulation: Se encarga de demodular una señal modulada en frecuencia para obtener el mensaje que porta.
+# Se usa un discriminador de fase: la señal se lleva a banda base multiplicándola por exp(-j*2*pi*f*t), se filtra el
+# término en 2*f y la derivada de la fase (ángulo entre muestras consecutivas) entrega m*mensaje.
+# Entradas:
+#           - modulated: Arreglo, corresponde a la señal modulada.
+#           - samples_carrier: Arreglo, corresponde a las muestras que se emplearon para crear la señal portadora.
+#           - freq: Entero, corresponde a la frecuencia de la señal portadora.
+#           - percentage: Entero, corresponde al porcentaje de modulación de la señal portadora.
+#           - meta_data: Arreglo, [frecuencia de muestreo de la señal original, número de muestras de la señal original].
+# Salida:
+#           - demod_signal: Arreglo, [frecuencia de muestreo, señal demodulada a 4 veces la frecuencia portadora].
+@profiling.profiled()
+def fm_demodulation(modulated, samples_carrier, freq, percentage, meta_data):
+    with profiling.stage("discriminator") as stage:
+        state = _FMState(freq, percentage)
+        demod_signal = [4*freq, np.concatenate([state.process(modulated, samples_carrier), state.flush()])]
+        stage.arrays(demod_signal=demod_signal)
+
+    # Se cambia la frecuencia de muestreo de la señal demodulada, para tener una soportada por wavfile.write()
+    with profiling.stage("downsample") as stage:
+        demod_signal_small = resampler.resample(demod_signal[1], 4*freq, meta_data[0], meta_data[1])
+        stage.arrays(demod_signal_small=demod_signal_small)
+    save_audio("audio_demod_fm_"+str(percentage)+".wav", meta_data[0], demod_signal_small/32768)
+
     plot_signal(np.linspace(0, len(demod_signal[1])/demod_signal[0], len(demod_signal[1])), demod_signal[1],
-                "Señal demodulada "+str(percentage)+"%", "T[s]", "Amplitud[dB]")
-    plot_signal(xf, ft_am_0, "TF Demodulación AM (sin filtro)" + str(percentage)+ "%", "Frecuencia[Hz]", "|F(w)|")
-    plot_signal(xf, ft_am_1, "TF Demodulación AM (con filtro)" + str(percentage)+ "%", "Frecuencia[Hz]", "|F(w)|")
+                "Señal demodulada FM "+str(percentage)+"%", "T[s]", "Amplitud[dB]")
     return demod_signal
 
 
+# Clase _FMState: Discriminador FM con estado, que permite demodular por bloques. Entre bloques se arrastran el estado
+# del filtro FIR, la última muestra en banda base (para el incremento de fase) y las muestras pendientes por el retardo
+# del filtro, que se compensa para que la salida quede alineada con la señal modulada.
+class _FMState:
+    def __init__(self, freq, percentage, dtype=None):
+        self.freq = freq
+        self.m = percentage/100
+        self.dtype = precision.resolve(dtype)
+        self.taps = sg.firwin(FM_FILTER_TAPS, 0.25).astype(self.dtype)
+        self.zi = np.zeros(FM_FILTER_TAPS - 1, dtype=precision.complex_dtype(self.dtype))
+        self.last = None
+        self.skip = (FM_FILTER_TAPS - 1)//2
+        self.output = 0.0
+
+    # Función process: Demodula un bloque de la señal.
+    # Entradas:
+    #           - block: Arreglo, bloque de la señal modulada.
+    #           - samples_carrier: Arreglo, instantes de tiempo del bloque.
+    # Salida:
+    #           - Arreglo con el mensaje recuperado, a la frecuencia de muestreo de la portadora.
+    def process(self, block, samples_carrier):
+        if len(block) == 0:
+            return np.zeros(0, dtype=self.dtype)
+        # Se baja la señal a banda base; el factor 2 compensa la mitad de amplitud que se pierde en el término en 2*f.
+        # La fase de la portadora se calcula en doble precisión.
+        mixer = precision.working(np.exp(-2j*np.pi*self.freq*samples_carrier), self.dtype)
+        iq, self.zi = sg.lfilter(self.taps, self.dtype.type(1), 2*precision.working(block, self.dtype)*mixer,
+                                 zi=self.zi)
+        previous = np.concatenate([[iq[0] if self.last is None else self.last], iq[:-1]])
+        self.last = iq[-1]
+        # El ángulo entre muestras consecutivas es el incremento de fase, sin necesidad de desenrollar la fase.
+        # Con índice 0 la señal no lleva el mensaje (es la portadora sin modular) y se entregan ceros.
+        scale = 4*self.freq / self.m if self.m != 0 else 0.0
+        message = np.angle(iq*np.conj(previous)) * self.dtype.type(scale)
+        # Se descartan las primeras muestras, que corresponden al retardo del filtro.
+        drop = min(self.skip, len(message))
+        self.skip -= drop
+        message = message[drop:]
+        if len(message) > 0:
+            self.output = message[-1]
+        return message
+
+    # Función flush: Completa el final de la señal (las muestras retenidas por el retardo del filtro) repitiendo la
+    # última muestra demodulada.
+    def flush(self):
+        return np.full((FM_FILTER_TAPS - 1)//2 - self.skip, self.output, dtype=self.dtype)
+
+
+# Función fm_demodulation_stream: Versión por bloques de la demodulación FM (sin escritura de audio ni gráficos).
+# Entrega el mismo resultado que fm_demodulation sobre la señal completa.
+# Entradas:
+#           - blocks: Iterable de arreglos, bloques consecutivos de la señal modulada (a 4 veces la portadora).
+#           - freq: Frecuencia de la portadora.
+#           - percentage: Entero, porcentaje de modulación.
+# Salida:
+#           - Generador de arreglos, bloques del mensaje recuperado a la frecuencia de muestreo de la portadora.
+def fm_demodulation_stream(blocks, freq, percentage):
+    state = _FMState(freq, percentage)
+    start = 0
+    for block in blocks:
+        samples_carrier = np.arange(start, start + len(block)) * (1/(4*freq))
+        start += len(block)
+        yield state.process(np.asarray(block), samples_carrier)
+    yield state.flush()
+
+
 # Función plot_spectrums: Se encarga de graficar los espectros de las señales entregadas
 # Entrada:
 #           - information: Arreglo, señal que contiene el mensaje que se desea modular.
@@ -146,42 +370,22 @@ def am_demodulation(modulated, samples_carrier, freq, percentage, meta_data):
 #           - carrier: Arreglo, señal correspondiente a la señal portadora.
 #           - samples_carrier: Arreglo, muestras del eje x de la señal portadora.
 #           - name: String, nombre con el que se guarda el gráfico.
-def plot_spectrums(information, modulated, carrier, samples_carrier, name):
-    # Cálculo de las transformadas de la moduladora, portadora y modulada.
-    ft_original = np.abs(fftp.fft(information))
-    ft_modulated = np.abs(fftp.fft(modulated))
-    ft_carrier = np.abs(fftp.fft(carrier))
-    samples = len(ft_original)
-    # Se cambia un parametro de matplotlib para poder graficar vectores de gran tamaño
-    plt.rcParams['agg.path.chunksize'] = 10000
-    plt.figure(figsize=(10.24, 7.20), dpi=100)
-    xf = fftp.fftfreq(samples, samples_carrier[2] - samples_carrier[1])
+#           - welch: Booleano, si es True se grafica el espectro promediado (Welch), recomendado para señales largas.
+@profiling.profiled()
+def plot_spectrums(information, modulated, carrier, samples_carrier, name, welch=False):
+    if not plotting.enabled():
+        return
+    # Cálculo de las transformadas (FFT real, solo frecuencias positivas) de la moduladora, portadora y modulada.
+    # Quedan en caché, así la portadora no se transforma de nuevo en cada porcentaje.
+    rate = 1/(samples_carrier[2] - samples_carrier[1])
+    # Se reduce cada espectro a su envolvente, con tantos puntos como pixeles tiene la figura.
+    spectrums = [plotting.envelope(*spectrum.magnitude(x, rate, welch)) for x in (information, carrier, modulated)]
     # Creación de una figura con subplots, correspondientes a cada transformada
-    plt.subplot(221)
-    plt.title("FT de la moduladora")
-    plt.ylabel("|F(w)|")
-    plt.xlabel("Frecuencia[Hz]")
-    plt.grid()
-    plt.plot(xf[0:samples//2], np.abs(ft_original[0:samples//2]))
-    plt.subplot(222)
-    plt.title("FT de la portadora")
-    plt.ylabel("|F(w)|")
-    plt.xlabel("Frecuencia[Hz]")
-    plt.grid()
-    plt.plot(xf[0:samples//2], np.abs(ft_carrier[0:samples//2]), "r")
-    plt.subplot(223)
-    plt.title("FT de la señal modulada")
-    plt.ylabel("|F(w)|")
-    plt.xlabel("Frecuencia[Hz]")
-    plt.grid()
-    plt.plot(xf[0:samples//2], np.abs(ft_modulated[0:samples//2]), "g")
-    plt.tight_layout()
-    dir_name = "./graphs/"
-    os.makedirs(dir_name, exist_ok=True)
-    plt.savefig(dir_name+name+'.png', bbox_inches='tight', dpi=100)
+    plotting.submit(plotting.render_spectrums, "./graphs/"+name+'.png', spectrums)
 
 
-# Función plot_signal: Se encarga de graficar una señal.
+# Función plot_signal: Se encarga de graficar una señal. Las series largas se reducen a su envolvente antes de graficar
+# y la figura se genera según el modo de plotting (en el momento, en segundo plano, diferida u omitida).
 # Entradas:
 #           - time: Arreglo, contiene los datos del eje x.
 #           - data: Arreglo, contiene los datos del eje y.
@@ -189,57 +393,371 @@ def plot_spectrums(information, modulated, carrier, samples_carrier, name):
 #           - x_axis: String, unidad de medida empleada en el eje x.
 #           - y_axis: String, unidad de medida empleada en el eje y.
 #           - x_limit: Arreglo, indica desde qué punto y hasta qué punto se grafica en el eje x.
+@profiling.profiled()
 def plot_signal(time, data, name, x_axis, y_axis, x_limit=[]):
-    # Se cambia un parametro de matplotlib para poder graficar vectores de gran tamaño
-    plt.rcParams['agg.path.chunksize'] = 10000
-    plt.figure(figsize=(10.24, 7.20), dpi=100)
-    if len(x_limit) == 2:
-        plt.xlim(x_limit[0], x_limit[1])
-    plt.plot(time, data)
-    plt.grid()
-    plt.title(name)
-    plt.xlabel(x_axis)
-    plt.ylabel(y_axis)
-    plt.tight_layout()
-    dir_name = "./graphs/"
-    os.makedirs(dir_name, exist_ok=True)
-    plt.savefig(dir_name + name + '.png', bbox_inches='tight', dpi=100)
+    if not plotting.enabled():
+        return
+    time, data = plotting.envelope(*plotting.visible(np.asarray(time), np.asarray(data), x_limit))
+    plotting.submit(plotting.render_signal, "./graphs/" + name + '.png', time, data, name, x_axis, y_axis,
+                    list(x_limit))
+
+
+# Función plot_original: Grafica el mensaje original ("Señal Original").
+# Entrada:
+#           - signal: Arreglo, [frecuencia de muestreo, datos del mensaje].
+def plot_original(signal):
+    plot_signal(np.linspace(0, len(signal[1])/signal[0], len(signal[1])), signal[1], "Señal Original", "T[s]",
+                "Amplitud[dB]")
+
+
+# Tamaño de bloque por defecto (en muestras del mensaje) usado por los modos de streaming.
+BLOCK_SIZE = 8192
+
+
+# Función _carrier_axis: Paso y número de muestras de la portadora, equivalentes a
+# np.arange(0, signal_time, 1/(4*freq)).
+def _carrier_axis(rate, length, freq):
+    step = 1 / (4 * freq)
+    return step, int(np.ceil((length / rate) / step))
+
+
+# Función _carrier_stream: Genera por bloques las muestras de la portadora y el mensaje llevado a esa frecuencia.
+# Entradas:
+#           - data: Arreglo, [frecuencia de muestreo, datos del mensaje]. Los datos pueden ser cualquier arreglo
+#                   indexable por rebanadas (por ejemplo un np.memmap).
+#           - freq: Frecuencia de la señal portadora.
+#           - block_size: Entero, cantidad de muestras del mensaje consumidas por bloque.
+# Salida:
+#           - Generador de tuplas (samples_carrier, information) para cada bloque.
+def _carrier_stream(data, freq, block_size):
+    rate, audio = data[0], data[1]
+    step, n_carrier = _carrier_axis(rate, len(audio), freq)
+    blocks = (audio[i:i + block_size] for i in range(0, len(audio), block_size))
+    start = 0
+    for information in resampler.resample_stream(blocks, rate, 4*freq, n_carrier):
+        samples_carrier = np.arange(start, start + len(information)) * step
+        start += len(information)
+        yield samples_carrier, information
+
+
+# Función am_modulation_stream: Versión por bloques de am_modulation. Consume el mensaje en bloques de tamaño fijo y
+# entrega la señal modulada por bloques, igual muestra a muestra a la de am_modulation pero con memoria acotada.
+# Entradas:
+#           - data: Arreglo, [frecuencia de muestreo, datos del mensaje].
+#           - percentage: Entero, porcentaje de modulación.
+#           - freq: Frecuencia de la señal portadora.
+#           - block_size: Entero, cantidad de muestras del mensaje consumidas por bloque.
+# Salida:
+#           - Generador de arreglos, bloques consecutivos de la señal modulada.
+def am_modulation_stream(data, percentage, freq, block_size=BLOCK_SIZE):
+    m = percentage/100
+    for samples_carrier, information in _carrier_stream(data, freq, block_size):
+        carrier = precision.working(np.cos(2 * np.pi * freq * samples_carrier))
+        # Misma expresión que ModulationContext.am, para obtener exactamente los mismos valores.
+        yield carrier + m*(information*carrier)
+
+
+# Función fm_modulation_stream: Versión por bloques de fm_modulation. La integral acumulativa del mensaje se calcula
+# con la regla del trapecio igual que cumtrapz, arrastrando entre bloques la última muestra y el valor acumulado.
+# Entradas:
+#           - data: Arreglo, [frecuencia de muestreo, datos del mensaje].
+#           - percentage: Entero, porcentaje de modulación.
+#           - freq: Frecuencia de la señal portadora.
+#           - block_size: Entero, cantidad de muestras del mensaje consumidas por bloque.
+# Salida:
+#           - Generador de arreglos, bloques consecutivos de la señal modulada.
+def fm_modulation_stream(data, percentage, freq, block_size=BLOCK_SIZE):
+    m = percentage/100
+    last_time = last_info = None
+    accumulated = 0.0
+    for samples_carrier, information in _carrier_stream(data, freq, block_size):
+        if last_time is None:
+            time, info = samples_carrier, information
+        else:
+            time = np.concatenate([[last_time], samples_carrier])
+            info = np.concatenate([[last_info], information])
+        # Se antepone el valor acumulado para que la suma sea secuencial, tal como en la integral de una pasada.
+        increments = np.diff(time) * (info[1:] + info[:-1]) / 2.0
+        integral_info = np.cumsum(np.concatenate([[accumulated], increments]))
+        if last_time is not None:
+            integral_info = integral_info[1:]
+        last_time, last_info, accumulated = samples_carrier[-1], information[-1], integral_info[-1]
+        yield precision.working(np.cos(2*np.pi*freq*samples_carrier+m*integral_info))
+
+
+# Clase AMModulator: Versión con estado de am_modulation para señales en vivo, cuyo largo no se conoce de antemano.
+# Recibe bloques del mensaje (de cualquier tamaño) y entrega los bloques de la señal modulada que ya pueden calcularse,
+# a 4 veces la frecuencia de la portadora. Las salidas de process() seguidas de la de flush() equivalen a am_modulation.
+class AMModulator:
+    # Constructor
+    # Entradas:
+    #           - rate: Entero, frecuencia de muestreo del mensaje.
+    #           - freq: Frecuencia de la señal portadora.
+    #           - percentage: Entero, porcentaje de modulación.
+    #           - dtype: Precisión de trabajo (ver precision), o None para la actual.
+    def __init__(self, rate, freq, percentage, dtype=None):
+        self.freq = freq
+        self.m = percentage/100
+        self.dtype = precision.resolve(dtype)
+        self.resampler = resampler.Resampler(*resampler.rational_ratio(rate, 4*freq), dtype=self.dtype)
+        self.produced = 0
+
+    # Función _samples: Instantes de las siguientes count muestras de la portadora.
+    def _samples(self, count):
+        samples_carrier = np.arange(self.produced, self.produced + count) * (1/(4*self.freq))
+        self.produced += count
+        return samples_carrier
+
+    # Función _modulate: Modula un bloque del mensaje ya llevado a la frecuencia de la portadora.
+    def _modulate(self, information):
+        carrier = precision.working(np.cos(2 * np.pi * self.freq * self._samples(len(information))), self.dtype)
+        return carrier + self.dtype.type(self.m)*(information*carrier)
+
+    # Función process: Recibe un bloque del mensaje y entrega el bloque de la señal modulada.
+    def process(self, block):
+        return self._modulate(self.resampler.process(block))
+
+    # Función flush: Entrega las muestras restantes al terminar el mensaje.
+    def flush(self):
+        return self._modulate(self.resampler.flush())
+
+
+# Clase FMModulator: Versión con estado de fm_modulation para señales en vivo. La integral del mensaje se calcula con
+# la regla del trapecio, arrastrando entre bloques la última muestra y el valor acumulado (ver fm_modulation_stream).
+class FMModulator(AMModulator):
+    def __init__(self, rate, freq, percentage, dtype=None):
+        super().__init__(rate, freq, percentage, dtype)
+        self.last_info = None
+        self.accumulated = 0.0
+
+    def _modulate(self, information):
+        samples_carrier = self._samples(len(information))
+        if len(information) == 0:
+            return np.zeros(0, dtype=self.dtype)
+        info = information if self.last_info is None else np.concatenate([[self.last_info], information])
+        increments = (info[1:] + info[:-1]) * (1/(8*self.freq))
+        integral_info = np.cumsum(np.concatenate([[self.accumulated], increments]))
+        if self.last_info is not None:
+            integral_info = integral_info[1:]
+        self.last_info, self.accumulated = information[-1], integral_info[-1]
+        return precision.working(np.cos(2*np.pi*self.freq*samples_carrier + self.m*integral_info), self.dtype)
+
+
+# Clase AMDemodulator: Versión con estado de am_demodulation (conversor de bajada, ver ddc) para señales en vivo.
+# Recibe bloques de la señal modulada, a 4 veces la portadora, y entrega el mensaje a la frecuencia rate.
+class AMDemodulator:
+    # Constructor
+    # Entradas:
+    #           - rate: Entero, frecuencia de muestreo del mensaje.
+    #           - freq: Frecuencia de la señal portadora.
+    #           - dtype: Precisión de trabajo (ver precision), o None para la actual.
+    def __init__(self, rate, freq, dtype=None):
+        self.converter = ddc.DDC(4*freq, freq, rate, dtype)
+
+    # Función process: Recibe un bloque de la señal modulada y entrega el bloque del mensaje.
+    def process(self, block):
+        return self.converter.process(block)
+
+    # Función flush: Entrega las muestras restantes al terminar la señal.
+    def flush(self):
+        return self.converter.flush()
+
+
+# Clase FMDemodulator: Versión con estado de fm_demodulation para señales en vivo: discriminador FM y cambio a la
+# frecuencia de muestreo del mensaje.
+class FMDemodulator:
+    # Constructor
+    # Entradas:
+    #           - rate: Entero, frecuencia de muestreo del mensaje.
+    #           - freq: Frecuencia de la señal portadora.
+    #           - percentage: Entero, porcentaje de modulación.
+    #           - dtype: Precisión de trabajo (ver precision), o None para la actual.
+    def __init__(self, rate, freq, percentage, dtype=None):
+        self.freq = freq
+        self.state = _FMState(freq, percentage, dtype)
+        self.resampler = resampler.converter(4*freq, rate, self.state.dtype)
+        self.received = 0
+
+    # Función process: Recibe un bloque de la señal modulada y entrega el bloque del mensaje.
+    def process(self, block):
+        samples_carrier = np.arange(self.received, self.received + len(block)) * (1/(4*self.freq))
+        self.received += len(block)
+        return self.resampler.process(self.state.process(np.asarray(block), samples_carrier))
+
+    # Función flush: Entrega las muestras restantes al terminar la señal.
+    def flush(self):
+        tail = self.resampler.process(self.state.flush())
+        return np.concatenate([tail, self.resampler.flush()])
+
+
+# Función modulate_file: Modula un archivo de audio y escribe el resultado en otro archivo, por bloques y con memoria
+# constante: la entrada se mapea desde el disco y la salida se escribe a medida que se genera. Se usan los mismos
+# factores de escala que am_modulation y fm_modulation, y por defecto la misma frecuencia de muestreo (4 veces la
+# portadora). La frecuencia de salida debe contener la banda modulada (hasta freq más la mitad de la frecuencia del
+# mensaje); a la frecuencia del mensaje el filtro que evita el repliegue dejaría el archivo en silencio.
+# Entradas:
+#           - in_name: String, archivo de audio de entrada.
+#           - out_name: String, archivo de audio de salida.
+#           - scheme: String, "AM" o "FM".
+#           - percentage: Entero, porcentaje de modulación.
+#           - freq: Frecuencia de la señal portadora.
+#           - channel: None para modular cada canal por separado (la salida tiene los mismos canales), un entero para
+#                      modular solo ese canal, o "mix" para modular el promedio de los canales.
+#           - sample_format: String, formato de las muestras de salida ("int16", "float32" o "float64").
+#           - block_size: Entero, cantidad de muestras del mensaje consumidas por bloque.
+#           - out_rate: Entero opcional, frecuencia de muestreo del archivo de salida. Por defecto 4*freq.
+def modulate_file(in_name, out_name, scheme, percentage, freq, channel="mix", sample_format="float32",
+                  block_size=BLOCK_SIZE, out_rate=None):
+    rate, audio = audio_io.read_audio(in_name, mmap=True)
+    if out_rate is None:
+        out_rate = 4*freq
+    elif out_rate < 2*freq + rate:
+        raise ValueError("La frecuencia de muestreo de salida debe ser al menos " + str(2*freq + rate)
+                         + " Hz para contener la señal modulada")
+    if channel is None:
+        channels = [audio_io.select_channel(audio, c) for c in range(audio_io.channel_count(audio))]
+    else:
+        channels = [audio_io.select_channel(audio, "lazy_mix" if channel == "mix" else channel)]
+    modulation_stream = am_modulation_stream if scheme == "AM" else fm_modulation_stream
+    scale = 3000 if scheme == "AM" else 10
+    # Cada canal tiene su propio flujo; todos consumen bloques del mismo largo, por lo que entregan bloques iguales.
+    streams = [modulation_stream([rate, data], percentage, freq, block_size) for data in channels]
+    if out_rate != 4*freq:
+        streams = [resampler.resample_stream(stream, 4*freq, out_rate) for stream in streams]
+    with audio_io.WavWriter(out_name, out_rate, len(channels), sample_format) as writer:
+        for blocks in zip(*streams):
+            writer.write(np.stack(blocks, axis=-1)/scale)
+
+
+# Señal compartida con los procesos del barrido paralelo (se asigna en cada proceso por _attach_shared_signal).
+_shared_signal = None
+_shared_memory = None
+_shared_context = None
+
+
+# Función run_job: Ejecuta un trabajo del barrido: modulación AM y su demodulación, o modulación FM, su demodulación y
+# su espectrograma.
+# Entradas:
+#           - signal: Arreglo, [frecuencia de muestreo, datos del mensaje].
+#           - scheme: String, "AM" o "FM".
+#           - percentage: Entero, porcentaje de modulación.
+#           - frequency: Entero, frecuencia a la que se modula el audio.
+#           - context: ModulationContext opcional, compartido entre los trabajos de una misma señal y frecuencia.
+def run_job(signal, scheme, percentage, frequency, context=None):
+    with profiling.stage(scheme+" "+str(percentage)+"%"):
+        if scheme == "AM":
+            am, sc = am_modulation(signal, percentage, frequency, context)
+            am_demodulation(am, sc, frequency, percentage, [signal[0], len(signal[1])], context)
+        else:
+            fm, sc = fm_modulation(signal, percentage, frequency, context)
+            fm_demodulation(fm, sc, frequency, percentage, [signal[0], len(signal[1])])
+            lab2lib.plot_spectrogram([frequency*4, fm], save_fig="./graphs/spec"+str(percentage))
+        # El trabajo termina cuando sus gráficos están guardados (en segundo plano se dibujan mientras se procesa la
+        # señal).
+        plotting.flush()
+
+
+# Función _attach_shared_signal: Inicializador de los procesos del barrido. Conecta el proceso con el bloque de memoria
+# compartida que contiene el audio, sin copiarlo, y fija el modo de los gráficos, la precisión del procesamiento y la
+# instrumentación.
+def _attach_shared_signal(name, rate, length, dtype, plots, working_dtype, profile):
+    global _shared_signal, _shared_memory
+    plotting.set_mode(plots)
+    precision.set_dtype(working_dtype)
+    profiling.clear()
+    if profile:
+        profiling.enable()
+    else:
+        profiling.disable()
+    _shared_memory = shared_memory.SharedMemory(name=name)
+    _shared_signal = [rate, np.ndarray((length,), dtype=dtype, buffer=_shared_memory.buf)]
+
+
+# Función _run_shared_job: Ejecuta un trabajo del barrido sobre la señal en memoria compartida. Cada proceso guarda su
+# propio contexto de modulación, que reutiliza en los trabajos siguientes. Entrega los registros de instrumentación del
+# trabajo, para reunirlos en el proceso principal.
+def _run_shared_job(scheme, percentage, frequency):
+    global _shared_context
+    if _shared_context is None or _shared_context.freq != frequency:
+        _shared_context = ModulationContext(_shared_signal, frequency)
+    run_job(_shared_signal, scheme, percentage, frequency, _shared_context)
+    records = profiling.records()
+    profiling.clear()
+    return records
+
+
+# Función _sweep_parallel: Ejecuta los trabajos del barrido en un conjunto de procesos. El audio se copia una sola vez a
+# memoria compartida. Los resultados se esperan en el orden de los trabajos, por lo que el progreso impreso es el mismo
+# que en la versión secuencial.
+def _sweep_parallel(signal, jobs, frequency, workers, plots, working_dtype, profile):
+    # Los gráficos pendientes se terminan antes de crear los procesos, para no copiarlos a medio dibujar.
+    plotting.flush()
+    audio = np.ascontiguousarray(signal[1])
+    memory = shared_memory.SharedMemory(create=True, size=max(audio.nbytes, 1))
+    try:
+        np.ndarray(audio.shape, dtype=audio.dtype, buffer=memory.buf)[:] = audio
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared_signal,
+                                 initargs=(memory.name, signal[0], len(audio), audio.dtype.str, plots,
+                                           working_dtype, profile)) as pool:
+            futures = [pool.submit(_run_shared_job, scheme, percentage, frequency) for scheme, percentage in jobs]
+            for (scheme, percentage), future in zip(jobs, futures):
+                print(scheme+" "+str(percentage)+"% en progreso... ", end="", flush=True)
+                profiling.extend(future.result())
+                print("OK!", flush=True)
+    finally:
+        memory.close()
+        memory.unlink()
 
 
-# Función lab4_modulation: Se encarga de aplicar modulaciones AM y FM con un porcentaje de modulación de 15%, 100% y
-# 125% sobre un archivo de audio a cierta frecuencia.
+# Función lab4_modulation: Se encarga de aplicar modulaciones AM y FM (y sus demodulaciones) sobre un archivo de audio a
+# cierta frecuencia, para cada uno de los porcentajes de modulación indicados (por defecto 15%, 100% y 125%).
 # Entradas:
 #           - file_name: String, nombre del archivo de audio que será modulado.
 #           - frequency: Entero, frecuencia a la que se modula el audio.
-def lab4_modulation(file_name, frequency):
+#           - percentages: Lista de enteros, porcentajes de modulación del barrido.
+#           - workers: Entero, número de procesos usados. Con 1 el barrido es secuencial, con None se usan todos los
+#                      núcleos disponibles.
+#           - plots: String, modo de los gráficos: "background" (por defecto), "sync", "deferred" u "off" (ver plotting).
+#           - dtype: String, precisión del procesamiento: "float64" (por defecto) o "float32" (ver precision).
+#           - profile: String opcional, archivo (.json o .csv) donde se guarda el reporte de instrumentación: tiempo real,
+#                      tiempo de CPU, pico de memoria y tamaño de los arreglos de cada etapa (ver profiling). Sin él no
+#                      se mide nada.
+def lab4_modulation(file_name, frequency, percentages=(15, 100, 125), workers=1, plots="background",
+                    dtype="float64", profile=None):
     if os.path.isfile(file_name):
         signal = open_audio(file_name)
-        plot_signal(np.linspace(0, len(signal[1])/signal[0], len(signal[1])), signal[1],
-                    "Señal Original", "T[s]", "Amplitud[dB]")
-        print("AM 15% en progreso... ", end="", flush=True)
-        am, sc = am_modulation(signal, 15, frequency)
-        am_demodulation(am, sc, frequency, 15, [signal[0], len(signal[1])])
-        print("OK!", flush=True)
-        print("AM 100% en progreso... ", end="", flush=True)
-        am, sc = am_modulation(signal, 100, frequency)
-        am_demodulation(am, sc, frequency, 100, [signal[0], len(signal[1])])
-        print("OK!", flush=True)
-        print("AM 125% en progreso... ", end="", flush=True)
-        am, sc = am_modulation(signal, 125, frequency)
-        am_demodulation(am, sc, frequency, 125, [signal[0], len(signal[1])])
-        print("OK!", flush=True)
-        print("FM 15% en progreso... ", end="", flush=True)
-        fm, sc = fm_modulation(signal, 15, frequency)
-        lab2lib.plot_spectrogram([frequency*4, fm], save_fig="./graphs/spec15")
-        print("OK!", flush=True)
-        print("FM 100% en progreso... ", end="", flush=True)
-        fm, sc = fm_modulation(signal, 100, frequency)
-        lab2lib.plot_spectrogram([frequency * 4, fm], save_fig="./graphs/spec100")
-        print("OK!", flush=True)
-        print("FM 125% en progreso... ", end="", flush=True)
-        fm, sc = fm_modulation(signal, 125, frequency)
-        lab2lib.plot_spectrogram([frequency * 4, fm], save_fig="./graphs/spec125")
-        print("OK!", flush=True)
+        previous_plots = plotting.get_mode()
+        previous_dtype = precision.get_dtype()
+        plotting.set_mode(plots)
+        precision.set_dtype(dtype)
+        if profile is not None:
+            profiling.clear()
+            profiling.enable()
+        # El estado global (modo de los gráficos, precisión e instrumentación) se restaura aunque algún trabajo falle.
+        try:
+            with profiling.stage("original"):
+                plot_original(signal)
+            jobs = [("AM", p) for p in percentages] + [("FM", p) for p in percentages]
+            if workers is None:
+                workers = os.cpu_count()
+            if workers > 1 and len(jobs) > 1:
+                _sweep_parallel(signal, jobs, frequency, min(workers, len(jobs)), plots, dtype, profile is not None)
+            else:
+                with profiling.stage("context"):
+                    context = ModulationContext(signal, frequency)
+                for scheme, percentage in jobs:
+                    print(scheme+" "+str(percentage)+"% en progreso... ", end="", flush=True)
+                    run_job(signal, scheme, percentage, frequency, context)
+                    print("OK!", flush=True)
+        finally:
+            plotting.set_mode(previous_plots)
+            precision.set_dtype(previous_dtype)
+            if profile is not None:
+                profiling.disable()
+        if profile is not None:
+            profiling.write_report(profile, {"file_name": file_name, "frequency": frequency,
+                                             "percentages": list(percentages), "workers": workers, "plots": plots,
+                                             "dtype": dtype})
         print("Proceso finalizado!")
     else:
         print("El archivo indicado no existe.\nVerifique si el nombre ingresado es correcto.")
@@ -0,0 +1,374 @@
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import functools
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import scipy
+import numpy as np
+import audio_io
+import ddc
+import lab2lib
+import plotting
+import precision
+import redes4
+import resampler
+import spectrum
+import stft
+
+# Códigos de salida: todo terminó bien, algún archivo o trabajo falló, o no había nada que procesar (argumentos
+# inválidos o patrones sin archivos).
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+# Directorio y tamaño máximo (MB) por defecto de la caché de resultados.
+CACHE_DIR = ".redes4_cache"
+CACHE_SIZE = 1024
+
+# Archivo que describe una entrada de la caché. Se escribe al final, por lo que una entrada sin él está incompleta.
+MANIFEST = "manifest.json"
+
+# Módulos cuyo código define los resultados: si alguno cambia, la caché anterior deja de ser válida.
+CODE_MODULES = (audio_io, ddc, lab2lib, plotting, precision, redes4, resampler, spectrum, stft)
+
+# Tamaño de los trozos con que se leen los archivos para calcular su hash.
+HASH_BLOCK = 1 << 20
+
+
+# Función expand_inputs: Expande los nombres y patrones (glob, con ** recursivo) de la línea de comandos.
+# Entrada:
+#           - patterns: Lista de strings, archivos o patrones.
+# Salida:
+#           - files: Lista de archivos encontrados, sin repetir, en el orden de los patrones.
+#           - unmatched: Lista de los patrones que no corresponden a ningún archivo.
+def expand_inputs(patterns):
+    files = []
+    seen = set()
+    unmatched = []
+    for pattern in patterns:
+        matches = sorted(name for name in glob.glob(pattern, recursive=True) if os.path.isfile(name))
+        if not matches and os.path.isfile(pattern):
+            matches = [pattern]
+        if not matches:
+            unmatched.append(pattern)
+        for name in matches:
+            real = os.path.realpath(name)
+            if real not in seen:
+                seen.add(real)
+                files.append(name)
+    return files, unmatched
+
+
+# Función file_digest: Hash SHA-256 del contenido de un archivo, leído por trozos.
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_BLOCK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Función code_version: Hash del código de CODE_MODULES y de las versiones de numpy y scipy.
+@functools.lru_cache(maxsize=1)
+def code_version():
+    digest = hashlib.sha256((np.__version__ + " " + scipy.__version__).encode())
+    for module in CODE_MODULES:
+        with open(module.__file__, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+# Función job_key: Clave de caché de un trabajo: hash del contenido del audio, de los parámetros y del código.
+# Entradas:
+#           - file_hash: String, hash del archivo de audio (ver file_digest).
+#           - freq: Entero, frecuencia de la portadora.
+#           - scheme: String, "AM", "FM" u "original" (gráfico del mensaje).
+#           - percentage: Entero, porcentaje de modulación (None para "original").
+#           - plots: Booleano, si se generan gráficos.
+#           - dtype: String, precisión del procesamiento.
+# Salida:
+#           - String hexadecimal.
+def job_key(file_hash, freq, scheme, percentage, plots, dtype):
+    params = {"file": file_hash, "freq": freq, "scheme": scheme, "percentage": percentage, "plots": plots,
+              "dtype": dtype, "code": code_version()}
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+# Clase Cache: Caché de resultados direccionada por contenido. Cada entrada es un directorio con los archivos que
+# generó un trabajo (./audio/... y ./graphs/...) y un manifiesto. El manifiesto se actualiza en cada uso, y al superar
+# el tamaño máximo se borran las entradas usadas hace más tiempo.
+class Cache:
+    # Constructor
+    # Entradas:
+    #           - directory: String, directorio de la caché (se crea si no existe).
+    #           - max_bytes: Entero opcional, tamaño máximo en bytes (sin límite si es None).
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    # Función path: Directorio de una entrada.
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    # Función has: Indica si existe una entrada completa.
+    def has(self, key):
+        return os.path.isfile(os.path.join(self.path(key), MANIFEST))
+
+    # Función staging: Directorio temporal (en el mismo disco que la caché) donde un trabajo genera sus archivos.
+    def staging(self):
+        return tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+
+    # Función store: Convierte un directorio temporal en una entrada. Si otro proceso guardó la misma entrada mientras
+    # tanto, se conserva la suya.
+    # Entradas:
+    #           - key: String, clave del trabajo (ver job_key).
+    #           - staging: String, directorio con los archivos generados.
+    #           - params: Diccionario, parámetros del trabajo (se guardan en el manifiesto).
+    def store(self, key, staging, params):
+        files = sorted(os.path.relpath(os.path.join(root, name), staging)
+                       for root, _, names in os.walk(staging) for name in names)
+        size = sum(os.path.getsize(os.path.join(staging, name)) for name in files)
+        with open(os.path.join(staging, MANIFEST), "w") as file:
+            json.dump({"params": params, "files": files, "bytes": size}, file, indent=2, sort_keys=True)
+        try:
+            os.replace(staging, self.path(key))
+        except OSError:
+            if not self.has(key):
+                raise
+            shutil.rmtree(staging, ignore_errors=True)
+
+    # Función materialize: Copia los archivos de una entrada a un directorio de salida y marca la entrada como usada.
+    # Los archivos que ya están en la salida (mismo tamaño y fecha) no se copian de nuevo.
+    # Salida:
+    #           - Lista con las rutas de los archivos en la salida.
+    def materialize(self, key, destination):
+        manifest = os.path.join(self.path(key), MANIFEST)
+        with open(manifest) as file:
+            files = json.load(file)["files"]
+        os.utime(manifest)
+        outputs = []
+        for name in files:
+            source = os.path.join(self.path(key), name)
+            target = os.path.join(destination, name)
+            outputs.append(target)
+            stat = os.stat(source)
+            if os.path.isfile(target):
+                current = os.stat(target)
+                if current.st_size == stat.st_size and current.st_mtime == stat.st_mtime:
+                    continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source, target)
+        return outputs
+
+    # Función evict: Borra las entradas usadas hace más tiempo hasta que la caché ocupe a lo más max_bytes.
+    # Salida:
+    #           - Número de entradas borradas.
+    def evict(self):
+        if self.max_bytes is None:
+            return 0
+        entries = []
+        for key in os.listdir(self.directory):
+            manifest = os.path.join(self.path(key), MANIFEST)
+            if os.path.isfile(manifest):
+                with open(manifest) as file:
+                    entries.append((os.path.getmtime(manifest), json.load(file)["bytes"], key))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self.path(key), ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+# Función _jobs: Trabajos de un archivo y una portadora: el gráfico del mensaje y un trabajo AM y uno FM por porcentaje,
+# igual que redes4.lab4_modulation.
+def _jobs(percentages):
+    return [("original", None)] + [("AM", p) for p in percentages] + [("FM", p) for p in percentages]
+
+
+# Función _drain_plots: Espera los gráficos pendientes de un trabajo que falló, ignorando sus errores.
+def _drain_plots():
+    while True:
+        try:
+            plotting.flush()
+            return
+        except Exception:
+            pass
+
+
+# Función _compute: Calcula los trabajos de un archivo y una portadora que no están en la caché y los guarda en ella.
+# Cada trabajo se ejecuta en su propio directorio temporal (redes4 escribe en ./audio y ./graphs), por lo que se
+# ejecuta en un proceso aparte o en el principal restaurando el directorio actual.
+# Entradas:
+#           - path: String, archivo de audio.
+#           - freq: Entero, frecuencia de la portadora.
+#           - jobs: Lista de tuplas (scheme, percentage, key).
+#           - cache_dir: String, directorio de la caché.
+#           - plots: String, modo de los gráficos (ver plotting).
+#           - dtype: String, precisión del procesamiento (ver precision).
+# Salida:
+#           - Lista de tuplas (scheme, percentage, error), con error None si el trabajo terminó bien.
+def _compute(path, freq, jobs, cache_dir, plots, dtype):
+    cache = Cache(cache_dir)
+    previous_plots = plotting.get_mode()
+    previous_dtype = precision.get_dtype()
+    previous_dir = os.getcwd()
+    plotting.set_mode(plots)
+    precision.set_dtype(dtype)
+    results = []
+    try:
+        signal = redes4.open_audio(path)
+        context = redes4.ModulationContext(signal, freq)
+        for scheme, percentage, key in jobs:
+            staging = cache.staging()
+            try:
+                os.chdir(staging)
+                if scheme == "original":
+                    redes4.plot_original(signal)
+                    plotting.flush()
+                else:
+                    redes4.run_job(signal, scheme, percentage, freq, context)
+                os.chdir(previous_dir)
+                cache.store(key, staging, {"file": os.path.abspath(path), "freq": freq, "scheme": scheme,
+                                           "percentage": percentage, "plots": plots, "dtype": dtype})
+                results.append((scheme, percentage, None))
+            except Exception as error:
+                _drain_plots()
+                results.append((scheme, percentage, repr(error)))
+            finally:
+                os.chdir(previous_dir)
+                shutil.rmtree(staging, ignore_errors=True)
+    finally:
+        plotting.set_mode(previous_plots)
+        precision.set_dtype(previous_dtype)
+    return results
+
+
+# Función _unit_result: Resultado de _compute para un archivo y una portadora. Si falla el archivo completo (por
+# ejemplo, no es un wav válido), todos sus trabajos pendientes quedan con ese error.
+def _unit_result(unit, result):
+    try:
+        return result()
+    except Exception as error:
+        return [(scheme, p, repr(error)) for scheme, p, _ in unit[3]]
+
+
+# Función _output_names: Nombre del directorio de salida de cada archivo (el nombre sin extensión, y si se repite entre
+# archivos de distintas carpetas, seguido del inicio de su hash).
+def _output_names(files, digests):
+    stems = [os.path.splitext(os.path.basename(name))[0] for name in files]
+    return [stem if stems.count(stem) == 1 else stem + "-" + digests[name][:8] for stem, name in zip(stems, files)]
+
+
+# Función run_batch: Procesa un lote de archivos de audio con varias portadoras y porcentajes. Solo se calculan los
+# trabajos cuyo resultado (según el contenido del audio, los parámetros y el código) no está en la caché; los demás se
+# copian desde ella. Los archivos se procesan en paralelo.
+# Entradas:
+#           - inputs: Lista de strings, archivos o patrones glob.
+#           - freqs: Lista de enteros, frecuencias de portadora.
+#           - percentages: Lista de enteros, porcentajes de modulación.
+#           - output_dir: String, directorio de salida. Cada archivo y portadora se guarda en
+#                         output_dir/<archivo>/<portadora>/ con las carpetas audio y graphs de redes4.
+#           - cache_dir: String, directorio de la caché.
+#           - cache_size: Número, tamaño máximo de la caché en MB.
+#           - workers: Entero, número de procesos (None, por defecto, para usar todos los núcleos).
+#           - plots: String, modo de los gráficos (ver plotting).
+#           - dtype: String, precisión del procesamiento (ver precision).
+# Salida:
+#           - Código de salida: EXIT_OK, EXIT_FAILED o EXIT_USAGE.
+def run_batch(inputs, freqs=(30000,), percentages=(15, 100, 125), output_dir="batch", cache_dir=CACHE_DIR,
+              cache_size=CACHE_SIZE, workers=None, plots="background", dtype="float64"):
+    files, unmatched = expand_inputs(inputs)
+    for pattern in unmatched:
+        print("Sin archivos para: " + pattern, file=sys.stderr)
+    if not files:
+        return EXIT_USAGE
+    cache = Cache(cache_dir, int(cache_size * 2 ** 20))
+    failed = 0
+    digests = {}
+    for name in files:
+        try:
+            digests[name] = file_digest(name)
+        except OSError as error:
+            print(name + ": " + str(error), file=sys.stderr)
+            failed += 1
+    files = [name for name in files if name in digests]
+    names = dict(zip(files, _output_names(files, digests)))
+
+    # Trabajos de cada archivo y portadora, y los que faltan en la caché.
+    units = []
+    for name in files:
+        for freq in freqs:
+            jobs = [(scheme, p, job_key(digests[name], freq, scheme, p, plots != "off", dtype))
+                    for scheme, p in _jobs(percentages)]
+            units.append((name, freq, jobs, [job for job in jobs if not cache.has(job[2])]))
+
+    errors = {}
+    missing = [unit for unit in units if unit[3]]
+    if workers is None:
+        workers = os.cpu_count()
+    if workers > 1 and len(missing) > 1:
+        # Los gráficos pendientes se terminan antes de crear los procesos (ver redes4._sweep_parallel).
+        plotting.flush()
+        with ProcessPoolExecutor(max_workers=min(workers, len(missing))) as pool:
+            futures = [(unit, pool.submit(_compute, unit[0], unit[1], unit[3], cache_dir, plots, dtype))
+                       for unit in missing]
+            for unit, future in futures:
+                errors[unit[0], unit[1]] = _unit_result(unit, future.result)
+    else:
+        for unit in missing:
+            errors[unit[0], unit[1]] = _unit_result(unit, functools.partial(_compute, unit[0], unit[1], unit[3],
+                                                                            cache_dir, plots, dtype))
+
+    computed = cached = 0
+    for name, freq, jobs, pending in units:
+        destination = os.path.join(output_dir, names[name], str(freq))
+        unit_errors = [(scheme, p, error) for scheme, p, error in errors.get((name, freq), []) if error is not None]
+        for scheme, p, error in unit_errors:
+            label = scheme if p is None else scheme + " " + str(p) + "%"
+            print("%s %d Hz %s: %s" % (name, freq, label, error), file=sys.stderr)
+        failed += len(unit_errors)
+        for scheme, p, key in jobs:
+            if cache.has(key):
+                cache.materialize(key, destination)
+        computed += len(pending) - len(unit_errors)
+        cached += len(jobs) - len(pending)
+        print("%s %d Hz: %d calculados, %d desde caché, %d con error" % (name, freq, len(pending) - len(unit_errors),
+                                                                        len(jobs) - len(pending), len(unit_errors)))
+    removed = cache.evict()
+    print("Total: %d calculados, %d desde caché, %d con error, %d entradas de caché borradas"
+          % (computed, cached, failed, removed))
+    return EXIT_FAILED if failed or unmatched else EXIT_OK
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Modulación y demodulación AM/FM de un lote de archivos de audio, "
+                                                 "sin interacción y con caché de resultados.")
+    parser.add_argument("inputs", nargs="+", help="archivos de audio o patrones (por ejemplo 'audios/**/*.wav')")
+    parser.add_argument("-f", "--freq", nargs="+", type=int, default=[30000], help="frecuencias de portadora (Hz)")
+    parser.add_argument("-p", "--percentages", nargs="+", type=int, default=[15, 100, 125],
+                        help="porcentajes de modulación")
+    parser.add_argument("-o", "--output", default="batch", help="directorio de salida")
+    parser.add_argument("--cache", default=CACHE_DIR, help="directorio de la caché")
+    parser.add_argument("--cache-size", type=float, default=CACHE_SIZE, help="tamaño máximo de la caché (MB)")
+    parser.add_argument("-j", "--workers", type=int, default=0,
+                        help="procesos en paralelo (0, por defecto: todos los núcleos; 1: uno a la vez)")
+    parser.add_argument("--plots", choices=plotting.MODES, default="background", help="modo de los gráficos")
+    parser.add_argument("--dtype", choices=precision.DTYPES, default="float64", help="precisión del procesamiento")
+    args = parser.parse_args(argv)
+    return run_batch(args.inputs, args.freq, args.percentages, args.output, args.cache, args.cache_size,
+                     args.workers or None, args.plots, args.dtype)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,597 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+import scipy.signal as sg
+import numpy as np
+import baseband
+import ddc
+import fdm
+import lab2lib
+import plotting
+import precision
+import profiling
+import redes4
+import resampler
+import spectrum
+import stft
+
+
+# Función _tones: Genera una señal de prueba compuesta por varios tonos, evaluada en los instantes indicados.
+# Entradas:
+#           - time: Arreglo, instantes de tiempo.
+#           - freqs: Lista, frecuencias de los tonos en Hz.
+# Salida:
+#           - Arreglo con la señal.
+def _tones(time, freqs):
+    return sum(np.sin(2 * np.pi * f * time + i) for i, f in enumerate(freqs))
+
+
+# Función _spectral_error: Error espectral relativo (en dB) entre una señal y su referencia ideal. Se descartan los
+# bordes para no medir el transitorio de los filtros.
+def _spectral_error(signal, reference, edge=0.05):
+    cut = int(len(signal) * edge)
+    diff = np.abs(np.fft.rfft(signal[cut:-cut] - reference[cut:-cut])) ** 2
+    ref = np.abs(np.fft.rfft(reference[cut:-cut])) ** 2
+    return 10 * np.log10(np.sum(diff) / np.sum(ref))
+
+
+# Función _best_time: Mejor tiempo de ejecución de una función entre varias repeticiones.
+def _best_time(function, repeat):
+    best = np.inf
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+# Función bench_resampling: Compara la conversión de frecuencia de muestreo con np.interp (usada antes en redes4) y
+# con el filtro polifásico, en ambos sentidos (mensaje -> portadora y portadora -> mensaje).
+# Entradas:
+#           - rate: Entero, frecuencia de muestreo del mensaje.
+#           - freq: Entero, frecuencia de la portadora (la señal se lleva a 4*freq).
+#           - duration: Número, duración de la señal de prueba en segundos.
+#           - repeat: Entero, repeticiones de cada medición.
+# Salida:
+#           - Lista de diccionarios con los resultados. También se imprime una tabla.
+def bench_resampling(rate=8192, freq=30000, duration=10, repeat=3):
+    tones = [rate * 0.05, rate * 0.17, rate * 0.31]
+    length = int(rate * duration)
+    samples_signal = np.arange(length) / rate
+    signal = _tones(samples_signal, tones)
+    samples_carrier = np.arange(0, length / rate, 1 / (4 * freq))
+    carrier_reference = _tones(samples_carrier, tones)
+    # Al bajar la frecuencia se agrega un tono fuera de banda (en la portadora) que debe eliminarse, no replegarse.
+    carrier_wideband = carrier_reference + np.cos(2 * np.pi * (freq + rate * 0.1) * samples_carrier)
+
+    cases = {
+        "interp up": lambda: np.interp(samples_carrier, samples_signal, signal),
+        "polyphase up": lambda: resampler.resample(signal, rate, 4 * freq, len(samples_carrier)),
+        "interp down": lambda: np.interp(samples_signal, samples_carrier, carrier_wideband),
+        "polyphase down": lambda: resampler.resample(carrier_wideband, 4 * freq, rate, length),
+    }
+    # Se diseña el filtro una vez antes de medir, igual que ocurre con la caché en un barrido.
+    resampler.resample(signal[:16], rate, 4 * freq)
+    resampler.resample(carrier_wideband[:16], 4 * freq, rate)
+
+    results = []
+    print("%-16s %12s %16s %14s" % ("caso", "tiempo [s]", "muestras/s", "error [dB]"))
+    for name, function in cases.items():
+        elapsed, output = _best_time(function, repeat)
+        reference = carrier_reference if name.endswith("up") else signal
+        error = _spectral_error(output, reference)
+        results.append({"case": name, "time": elapsed, "throughput": len(output) / elapsed, "error_db": error})
+        print("%-16s %12.4f %16.0f %14.1f" % (name, elapsed, len(output) / elapsed, error))
+    return results
+
+
+# Función _relative_error: Error relativo entre dos señales, opcionalmente solo en una banda de frecuencias.
+def _relative_error(signal, reference, rate=None, band=None):
+    n = min(len(signal), len(reference))
+    diff, ref = signal[:n] - reference[:n], reference[:n]
+    if band is not None:
+        keep = np.fft.rfftfreq(n, 1 / rate) < band
+        diff, ref = np.fft.rfft(diff)[keep], np.fft.rfft(ref)[keep]
+    return np.linalg.norm(diff) / np.linalg.norm(ref)
+
+
+# Tolerancias del error relativo entre la simulación en banda base y la pasabanda. Con handel.wav los errores medidos
+# son de 2.4e-6 (AM), 2.1e-3 (AM demodulada) y 7.2e-3 (FM) en el peor caso.
+BASEBAND_TOLERANCE = {"am": 1e-5, "am_demod": 5e-3, "fm": 2e-2}
+
+
+# Función validate_baseband: Compara la simulación en banda base con la simulación pasabanda a 4 veces la portadora.
+# La demodulación AM se compara bajo el 75% de la frecuencia de Nyquist del mensaje, porque cerca de ella la ruta
+# pasabanda atenúa el mensaje al subir y bajar la frecuencia de muestreo. Cada error se compara con
+# BASEBAND_TOLERANCE.
+# Entradas:
+#           - data: Arreglo, [frecuencia de muestreo, datos del mensaje].
+#           - freq: Entero, frecuencia de la portadora.
+#           - percentages: Lista de enteros, porcentajes de modulación.
+# Salida:
+#           - Lista de diccionarios con los errores relativos y si están bajo la tolerancia ("ok"). También se imprime
+#             una tabla.
+def validate_baseband(data, freq=30000, percentages=(15, 100, 125)):
+    context = redes4.ModulationContext(data, freq)
+    meta_data = [data[0], len(data[1])]
+    results = []
+    print("%-6s %16s %16s %16s %6s" % ("%", "AM modulada", "AM demodulada", "FM modulada", "ok"))
+    for percentage in percentages:
+        z, bb_rate = baseband.am_modulation_iq(data, percentage)
+        am_error = _relative_error(baseband.upconvert(z, bb_rate, freq)[0], context.am([percentage])[0])
+        demod = baseband.am_demodulation_iq(z, bb_rate, meta_data)
+        demod_error = _relative_error(demod, context.am_demodulated([percentage], small=True)[0], data[0],
+                                      0.75 * data[0] / 2)
+        z, bb_rate = baseband.fm_modulation_iq(data, percentage)
+        fm_error = _relative_error(baseband.upconvert(z, bb_rate, freq)[0], context.fm([percentage])[0])
+        errors = {"am": am_error, "am_demod": demod_error, "fm": fm_error}
+        ok = all(errors[name] <= tolerance for name, tolerance in BASEBAND_TOLERANCE.items())
+        results.append(dict(errors, percentage=percentage, ok=ok))
+        print("%-6d %16.2e %16.2e %16.2e %6s" % (percentage, am_error, demod_error, fm_error, "si" if ok else "NO"))
+    return results
+
+
+# Función bench_baseband: Mide el tiempo de modulación y demodulación AM y de modulación FM en banda base y en
+# pasabanda para varias frecuencias de portadora. En banda base el tiempo no depende de la portadora.
+# Entradas:
+#           - rate: Entero, frecuencia de muestreo del mensaje.
+#           - duration: Número, duración de la señal de prueba en segundos.
+#           - freqs: Lista, frecuencias de portadora a medir.
+#           - passband_limit: Número, mayor portadora para la que se mide la ruta pasabanda.
+# Salida:
+#           - Lista de diccionarios con los tiempos. También se imprime una tabla.
+def bench_baseband(rate=8192, duration=2, freqs=(30000, 300000, 3000000), passband_limit=300000, percentage=100):
+    length = int(rate * duration)
+    data = [rate, 10000 * _tones(np.arange(length) / rate, [rate * 0.05, rate * 0.17])]
+    meta_data = [rate, length]
+
+    def run_baseband(freq):
+        z, bb_rate = baseband.am_modulation_iq(data, percentage)
+        baseband.am_demodulation_iq(z, bb_rate, meta_data)
+        baseband.fm_modulation_iq(data, percentage)
+
+    def run_passband(freq):
+        context = redes4.ModulationContext(data, freq)
+        context.am_demodulated([percentage], small=True)
+        context.fm([percentage])
+
+    results = []
+    print("%-12s %16s %16s" % ("portadora", "banda base [s]", "pasabanda [s]"))
+    for freq in freqs:
+        bb_time = _best_time(lambda: run_baseband(freq), 1)[0]
+        pb_time = _best_time(lambda: run_passband(freq), 1)[0] if freq <= passband_limit else np.nan
+        results.append({"freq": freq, "baseband": bb_time, "passband": pb_time})
+        print("%-12d %16.4f %16.4f" % (freq, bb_time, pb_time))
+    return results
+
+
+# Función _filter_demodulation: Demodulación AM anterior al conversor de bajada: producto con la portadora, filtro paso
+# bajo a 4 veces la portadora sobre la señal completa y cambio de frecuencia de muestreo.
+def _filter_demodulation(modulated, carrier, freq, meta_data):
+    filtered = lab2lib.Filter(4 * freq, freq / 2).process(modulated * carrier)
+    return resampler.resample(filtered, 4 * freq, meta_data[0], meta_data[1])
+
+
+# Función _iir_response: Aplica a una señal (a la frecuencia del mensaje) la respuesta en frecuencia del filtro paso bajo
+# Butterworth usado por la ruta anterior, para comparar ambas rutas sin la distorsión de fase de ese filtro.
+def _iir_response(signal, rate, freq):
+    n = len(signal)
+    _, response = sg.sosfreqz(lab2lib.filter_sos([4 * freq], freq / 2), worN=np.fft.rfftfreq(n, 1 / rate),
+                              fs=4 * freq)
+    return np.fft.irfft(np.fft.rfft(signal) * response, n)
+
+
+# Función bench_ddc: Compara la demodulación AM con el conversor de bajada (ddc) y con la ruta anterior (filtro sobre la
+# señal completa). El error se mide bajo el 75% de la frecuencia de Nyquist del mensaje, después de aplicar a la salida
+# del conversor la respuesta del filtro Butterworth de la ruta anterior.
+# Entradas:
+#           - data: Arreglo, [frecuencia de muestreo, datos del mensaje].
+#           - freqs: Lista, frecuencias de portadora a medir.
+#           - percentage: Entero, porcentaje de modulación.
+#           - repeat: Entero, repeticiones de cada medición.
+# Salida:
+#           - Lista de diccionarios con tiempos y errores. También se imprime una tabla.
+def bench_ddc(data, freqs=(30000, 100000), percentage=100, repeat=3):
+    meta_data = [data[0], len(data[1])]
+    results = []
+    print("%-12s %14s %14s %10s %12s" % ("portadora", "filtro [s]", "ddc [s]", "speedup", "error"))
+    for freq in freqs:
+        context = redes4.ModulationContext(data, freq)
+        modulated = context.am([percentage])[0]
+        carrier = context.carrier
+        filter_time, previous = _best_time(lambda: _filter_demodulation(modulated, carrier, freq, meta_data), repeat)
+        ddc_time, current = _best_time(lambda: ddc.downconvert(modulated, 4 * freq, freq, data[0], meta_data[1]),
+                                       repeat)
+        error = _relative_error(_iir_response(current, data[0], freq), previous, data[0], 0.75 * data[0] / 2)
+        results.append({"freq": freq, "filter": filter_time, "ddc": ddc_time, "error": error})
+        print("%-12d %14.4f %14.4f %10.1f %12.2e" % (freq, filter_time, ddc_time, filter_time / ddc_time, error))
+    return results
+
+
+# Tolerancia del error relativo entre la salida por bloques del conversor de bajada y la de la señal completa.
+BLOCK_TOLERANCE = 1e-9
+
+
+# Función validate_ddc_blocks: Verifica que el conversor de bajada entregue lo mismo procesando la señal por bloques que
+# completa (mismo número de muestras y error relativo bajo BLOCK_TOLERANCE), con bloques que no son múltiplos de los
+# factores de diezmado.
+# Entradas:
+#           - data: Arreglo, [frecuencia de muestreo, datos del mensaje].
+#           - freq: Entero, frecuencia de la portadora.
+#           - out_rate: Número, frecuencia de muestreo de salida.
+#           - blocks: Lista de enteros, tamaños de bloque a probar.
+#           - percentage: Entero, porcentaje de modulación.
+# Salida:
+#           - Booleano, True si todos los tamaños de bloque coinciden. También se imprime una tabla.
+def validate_ddc_blocks(data, freq=30000, out_rate=44100, blocks=(999, 1000, 2721, 4410), percentage=100):
+    modulated = redes4.ModulationContext(data, freq).am([percentage])[0]
+    reference = ddc.downconvert(modulated, 4 * freq, freq, out_rate)
+    passed = True
+    print("%-10s %12s %12s %12s" % ("bloque", "muestras", "esperadas", "error"))
+    for size in blocks:
+        converter = ddc.DDC(4 * freq, freq, out_rate)
+        parts = [converter.process(modulated[i:i + size]) for i in range(0, len(modulated), size)]
+        output = np.concatenate(parts + [converter.flush()])
+        error = _relative_error(output, reference) if len(output) == len(reference) else np.inf
+        ok = error <= BLOCK_TOLERANCE
+        passed = passed and ok
+        print("%-10d %12d %12d %12.2e %s" % (size, len(output), len(reference), error, "" if ok else "FALLA"))
+    return passed
+
+
+# Tolerancia del error relativo entre el archivo de modulate_file (en float32) y la señal de ModulationContext.
+FILE_TOLERANCE = 1e-4
+
+
+# Función validate_modulate_file: Modula un archivo con redes4.modulate_file (a 4 veces la portadora y a otra
+# frecuencia de salida) y compara lo escrito con la señal de ModulationContext, con la misma escala y frecuencia. Un
+# archivo en silencio, como el que resulta al bajar la señal a la frecuencia del mensaje, tiene error cercano a 1.
+# Entradas:
+#           - name: String, archivo de audio del mensaje.
+#           - freq: Entero, frecuencia de la portadora.
+#           - percentage: Entero, porcentaje de modulación.
+#           - out_rates: Lista, frecuencias de salida a probar (None: la de modulate_file por defecto).
+# Salida:
+#           - Booleano, True si todos los archivos coinciden con la referencia. También se imprime una tabla.
+def validate_modulate_file(name="handel.wav", freq=30000, percentage=100, out_rates=(None, 96000)):
+    context = redes4.ModulationContext(redes4.open_audio(name), freq)
+    references = {"AM": context.am([percentage])[0] / 3000, "FM": context.fm([percentage])[0] / 10}
+    passed = True
+    print("%-6s %10s %12s %12s %12s" % ("esq.", "frecuencia", "muestras", "pico", "error"))
+    with tempfile.TemporaryDirectory() as directory:
+        out_name = os.path.join(directory, "modulated.wav")
+        for scheme, out_rate in itertools.product(references, out_rates):
+            redes4.modulate_file(name, out_name, scheme, percentage, freq, out_rate=out_rate)
+            rate, output = redes4.open_audio(out_name)
+            reference = references[scheme]
+            if out_rate is not None:
+                reference = resampler.resample(reference, 4 * freq, out_rate)
+            error = _relative_error(output, reference) if len(output) == len(reference) else np.inf
+            peak = np.max(np.abs(output))
+            ok = error <= FILE_TOLERANCE and peak > np.max(np.abs(reference)) / 2
+            passed = passed and ok
+            print("%-6s %10d %12d %12.4f %12.2e %s" % (scheme, rate, len(output), peak, error, "" if ok else "FALLA"))
+    return passed
+
+
+# Tolerancia del error relativo de cada etapa en precisión simple respecto de la referencia en doble precisión.
+PRECISION_TOLERANCE = 1e-3
+
+
+# Función _with_dtype: Ejecuta una función con la precisión global indicada, restaurando la anterior al terminar.
+def _with_dtype(dtype, function):
+    previous = precision.get_dtype()
+    precision.set_dtype(dtype)
+    try:
+        return function()
+    finally:
+        precision.set_dtype(previous)
+
+
+# Función validate_precision: Compara cada etapa del procesamiento en float32 con la referencia en float64: error
+# relativo, memoria del resultado y tiempo. Cada etapa se ejecuta con la precisión global correspondiente.
+# Entradas:
+#           - data: Arreglo, [frecuencia de muestreo, datos del mensaje].
+#           - freq: Entero, frecuencia de la portadora.
+#           - percentage: Entero, porcentaje de modulación.
+# Salida:
+#           - Lista de diccionarios con los resultados de cada etapa, incluido si el error está bajo
+#             PRECISION_TOLERANCE y el resultado queda en float32 ("ok"). También se imprime una tabla.
+def validate_precision(data, freq=30000, percentage=100):
+    rate = 4 * freq
+    meta_data = [data[0], len(data[1])]
+
+    def modulated(scheme):
+        context = redes4.ModulationContext(data, freq)
+        return context.am([percentage])[0] if scheme == "AM" else context.fm([percentage])[0]
+
+    def fm_demodulated():
+        return np.concatenate(list(redes4.fm_demodulation_stream([modulated("FM")], freq, percentage)))
+
+    stages = {
+        "resample": lambda: resampler.resample(data[1], data[0], rate),
+        "AM": lambda: modulated("AM"),
+        "FM": lambda: modulated("FM"),
+        "AM demod (ddc)": lambda: ddc.downconvert(modulated("AM"), rate, freq, data[0], meta_data[1]),
+        "FM demod": fm_demodulated,
+        "filter_signal": lambda: lab2lib.filter_signal(data, 1000)[1],
+        "espectro": lambda: spectrum.magnitude(modulated("AM"), rate)[1],
+        "espectrograma": lambda: stft.spectrogram_view(modulated("FM"), rate, 1024, 720)[2],
+    }
+    results = []
+    print("%-16s %12s %12s %12s %10s %6s" % ("etapa", "error", "bytes f64", "bytes f32", "speedup", "ok"))
+    for name, stage in stages.items():
+        spectrum.clear_cache()
+        time64, reference = _best_time(lambda: _with_dtype("float64", stage), 1)
+        spectrum.clear_cache()
+        time32, single = _best_time(lambda: _with_dtype("float32", stage), 1)
+        error = _relative_error(single.astype(reference.dtype), reference)
+        ok = error < PRECISION_TOLERANCE and single.dtype == np.float32
+        results.append({"stage": name, "error": error, "bytes64": reference.nbytes, "bytes32": single.nbytes,
+                        "speedup": time64 / time32, "ok": ok})
+        print("%-16s %12.2e %12d %12d %10.2f %6s" % (name, error, reference.nbytes, single.nbytes, time64 / time32,
+                                                     "si" if ok else "NO"))
+    return results
+
+
+# Función bench_fdm: Mide la multiplexación por división de frecuencia con un número creciente de estaciones. Cada
+# estación transmite un trozo distinto del mensaje, en portadoras separadas por 1.25 veces el ancho de la estación. La
+# frecuencia de muestreo de la señal compuesta se fija con el mayor número de estaciones, para que solo cambie N.
+# Entradas:
+#           - data: Arreglo, [frecuencia de muestreo, datos del mensaje].
+#           - counts: Lista, números de estaciones a medir.
+#           - scheme: String, "AM" o "FM".
+#           - percentage: Entero, porcentaje de modulación.
+#           - first: Número, frecuencia de la primera portadora.
+# Salida:
+#           - Lista de diccionarios con tiempos, memoria y la menor correlación entre mensaje y mensaje recuperado.
+#             También se imprime una tabla.
+def bench_fdm(data, counts=(1, 2, 4, 8), scheme="AM", percentage=100, first=30000):
+    length = len(data[1]) // 2
+    messages = [[data[0], np.roll(data[1], -k * len(data[1]) // max(counts))[:length].astype(float)]
+                for k in range(max(counts))]
+    widths = [fdm.bandwidth(message, percentage, scheme) for message in messages]
+    spacing = int(np.ceil(2.5 * max(widths)))
+    freqs = [first + k * spacing for k in range(max(counts))]
+    # Múltiplo de la frecuencia del mensaje, para que el cambio de frecuencia de muestreo use un filtro corto.
+    rate = data[0] * int(np.ceil(4 * (freqs[-1] + spacing) / data[0]))
+    edge = length // 50
+    results = []
+    print("%-10s %12s %14s %12s %14s" % ("estaciones", "tiempo [s]", "tiempo/N [s]", "pico [MB]", "correlación"))
+    for count in counts:
+        def run():
+            composite = fdm.multiplex(messages[:count], freqs[:count], scheme, percentage, rate)
+            return fdm.demultiplex(composite, freqs[:count], widths[:count], [data[0], length], scheme, percentage)
+        elapsed, recovered = _best_time(run, 1)
+        peak = _peak_memory(run)
+        correlation = min(np.corrcoef(recovered[k, edge:-edge], messages[k][1][edge:-edge])[0, 1]
+                          for k in range(count))
+        results.append({"count": count, "time": elapsed, "peak_bytes": peak, "correlation": correlation})
+        print("%-10d %12.4f %14.4f %12.1f %14.5f" % (count, elapsed, elapsed / count, peak / 2 ** 20, correlation))
+    return results
+
+
+# Grilla de parámetros por defecto de la suite de rendimiento: duración del mensaje (s), frecuencia de muestreo del
+# mensaje, frecuencia de la portadora e índice de modulación (porcentaje).
+SUITE_GRID = {"duration": (1, 4), "rate": (8192, 44100), "freq": (30000, 100000), "percentage": (15, 100)}
+
+# Variación relativa tolerada antes de marcar una regresión: caída del throughput y aumento del pico de memoria.
+TIME_TOLERANCE = 0.2
+MEMORY_TOLERANCE = 0.1
+
+
+# Función _message: Mensaje sintético (dos tonos, en el rango de un audio de 16 bits), [frecuencia de muestreo, datos].
+def _message(duration, rate):
+    samples = np.arange(int(rate * duration)) / rate
+    return [rate, np.round(10000 * _tones(samples, [rate * 0.05, rate * 0.17])).astype(np.int16)]
+
+
+# Función _modulated: Señal modulada de prueba (fuera de la medición) y sus muestras de portadora.
+def _modulated(data, scheme, freq, percentage):
+    context = redes4.ModulationContext(data, freq)
+    signal = context.am([percentage])[0] if scheme == "AM" else context.fm([percentage])[0]
+    return signal, context.samples_carrier
+
+
+# Casos de la suite. Cada uno indica los parámetros de la grilla de los que depende (los demás no se repiten) y una
+# función que, dados esos parámetros, prepara las entradas y entrega (función a medir, muestras procesadas por llamada).
+# El throughput de las etapas sobre la portadora se cuenta en muestras a 4 veces la portadora; el de las etapas sobre
+# el mensaje, en muestras del mensaje.
+def _case_am_modulation(duration, rate, freq, percentage):
+    data = _message(duration, rate)
+    samples = redes4._carrier_axis(rate, len(data[1]), freq)[1]
+    return lambda: redes4.am_modulation(data, percentage, freq), samples
+
+
+def _case_fm_modulation(duration, rate, freq, percentage):
+    data = _message(duration, rate)
+    samples = redes4._carrier_axis(rate, len(data[1]), freq)[1]
+    return lambda: redes4.fm_modulation(data, percentage, freq), samples
+
+
+def _case_am_demodulation(duration, rate, freq, percentage):
+    data = _message(duration, rate)
+    modulated, samples_carrier = _modulated(data, "AM", freq, percentage)
+    meta_data = [rate, len(data[1])]
+    return lambda: redes4.am_demodulation(modulated, samples_carrier, freq, percentage, meta_data), len(modulated)
+
+
+def _case_filter_signal(duration, rate):
+    data = _message(duration, rate)
+    return lambda: lab2lib.filter_signal(data, rate / 8), len(data[1])
+
+
+def _case_spectrogram(duration, rate):
+    data = _message(duration, rate)
+    return lambda: lab2lib.spectrogram(data), len(data[1])
+
+
+def _case_spectrum(duration, rate, freq):
+    modulated = _modulated(_message(duration, rate), "AM", freq, 100)[0]
+
+    # Se borra la caché de espectros para medir el cálculo y no la búsqueda.
+    def run():
+        spectrum.clear_cache()
+        return spectrum.magnitude(modulated, 4 * freq)
+    return run, len(modulated)
+
+
+SUITE_CASES = {
+    "am_modulation": (("duration", "rate", "freq", "percentage"), _case_am_modulation),
+    "fm_modulation": (("duration", "rate", "freq", "percentage"), _case_fm_modulation),
+    "am_demodulation": (("duration", "rate", "freq", "percentage"), _case_am_demodulation),
+    "filter_signal": (("duration", "rate"), _case_filter_signal),
+    "spectrogram": (("duration", "rate"), _case_spectrogram),
+    "spectrum": (("duration", "rate", "freq"), _case_spectrum),
+}
+
+
+# Función _peak_memory: Pico de memoria (bytes sobre lo ya asignado) de una llamada, medido con tracemalloc en una
+# ejecución aparte, para no alterar los tiempos.
+def _peak_memory(function):
+    profiling.clear()
+    profiling.enable(memory=True)
+    try:
+        with profiling.stage("suite"):
+            function()
+        return profiling.records()[-1]["peak_bytes"]
+    finally:
+        profiling.disable()
+        profiling.clear()
+
+
+# Función _case_key: Identificador de un resultado de la suite (caso y parámetros), usado para comparar con la base.
+def _case_key(result):
+    return result["case"] + "".join(" %s=%g" % (name, result[name]) for name in SUITE_GRID if name in result)
+
+
+# Función run_suite: Mide los casos de la suite sobre mensajes sintéticos, con los gráficos desactivados. Los archivos
+# de audio que escriben las funciones de redes4 se guardan en un directorio temporal.
+# Entradas:
+#           - grid: Diccionario, valores de cada parámetro (ver SUITE_GRID).
+#           - cases: Lista opcional de nombres de SUITE_CASES (por defecto todos).
+#           - repeat: Entero, repeticiones de cada medición (se usa el mejor tiempo).
+#           - memory: Booleano, si es True se mide además el pico de memoria.
+#           - dtype: String, precisión del procesamiento (ver precision).
+# Salida:
+#           - Lista de diccionarios con los parámetros, tiempo, throughput (muestras/s) y pico de memoria de cada
+#             caso. También se imprime una tabla.
+def run_suite(grid=SUITE_GRID, cases=None, repeat=3, memory=True, dtype="float64"):
+    previous_plots = plotting.get_mode()
+    previous_dtype = precision.get_dtype()
+    previous_dir = os.getcwd()
+    plotting.set_mode("off")
+    precision.set_dtype(dtype)
+    results = []
+    print("%-64s %12s %16s %12s" % ("caso", "tiempo [s]", "muestras/s", "pico [MB]"))
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            for name in cases or SUITE_CASES:
+                params, setup = SUITE_CASES[name]
+                for values in itertools.product(*(grid[param] for param in params)):
+                    config = dict(zip(params, values))
+                    function, samples = setup(**config)
+                    elapsed = _best_time(function, repeat)[0]
+                    peak = _peak_memory(function) if memory else None
+                    result = dict(config, case=name, time=elapsed, throughput=samples / elapsed, peak_bytes=peak)
+                    results.append(result)
+                    print("%-64s %12.4f %16.0f %12s" % (_case_key(result), elapsed, samples / elapsed,
+                                                        "-" if peak is None else "%.1f" % (peak / 2 ** 20)))
+    finally:
+        os.chdir(previous_dir)
+        plotting.set_mode(previous_plots)
+        precision.set_dtype(previous_dtype)
+    return results
+
+
+# Función save_baseline: Guarda los resultados de la suite en un archivo JSON, para compararlos en otra versión.
+def save_baseline(results, path, dtype="float64"):
+    with open(path, "w") as file:
+        json.dump({"numpy": np.__version__, "dtype": dtype, "results": results}, file, indent=2, sort_keys=True)
+
+
+# Función compare_baseline: Compara los resultados de la suite con los de una base guardada y marca como regresión los
+# casos cuyo throughput cae más que time_tolerance o cuyo pico de memoria crece más que memory_tolerance.
+# Entradas:
+#           - results: Lista, resultados de run_suite.
+#           - path: String, archivo JSON escrito por save_baseline.
+#           - time_tolerance: Número, caída relativa del throughput tolerada.
+#           - memory_tolerance: Número, aumento relativo del pico de memoria tolerado.
+# Salida:
+#           - Lista con las claves de los casos con regresión. También se imprime una tabla.
+def compare_baseline(results, path, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    with open(path) as file:
+        baseline = {_case_key(result): result for result in json.load(file)["results"]}
+    regressions = []
+    print("%-64s %12s %12s %10s" % ("caso", "throughput", "memoria", "estado"))
+    for result in results:
+        key = _case_key(result)
+        if key not in baseline:
+            print("%-64s %12s %12s %10s" % (key, "-", "-", "nuevo"))
+            continue
+        speed = result["throughput"] / baseline[key]["throughput"]
+        memory = None
+        if result["peak_bytes"] is not None and baseline[key]["peak_bytes"]:
+            memory = result["peak_bytes"] / baseline[key]["peak_bytes"]
+        regression = speed < 1 - time_tolerance or (memory is not None and memory > 1 + memory_tolerance)
+        if regression:
+            regressions.append(key)
+        print("%-64s %11.2fx %12s %10s" % (key, speed, "-" if memory is None else "%.2fx" % memory,
+                                          "REGRESION" if regression else "ok"))
+    return regressions
+
+
+# Función suite_main: Ejecuta la suite desde la línea de comandos (python redes4_bench.py suite ...). Termina con código
+# 1 si hay regresiones respecto de la base.
+def suite_main(argv):
+    parser = argparse.ArgumentParser(prog="redes4_bench.py suite", description="Suite de rendimiento de redes4.")
+    parser.add_argument("--cases", nargs="+", choices=list(SUITE_CASES), help="casos a medir (por defecto todos)")
+    for name, values in SUITE_GRID.items():
+        parser.add_argument("--" + name, nargs="+", type=float if name == "duration" else int, default=list(values))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="no medir el pico de memoria")
+    parser.add_argument("--dtype", choices=precision.DTYPES, default="float64")
+    parser.add_argument("--save", metavar="ARCHIVO", help="guardar los resultados como base")
+    parser.add_argument("--compare", metavar="ARCHIVO", help="comparar con una base guardada")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE)
+    args = parser.parse_args(argv)
+    grid = {name: getattr(args, name) for name in SUITE_GRID}
+    results = run_suite(grid, args.cases, args.repeat, not args.no_memory, args.dtype)
+    if args.save:
+        save_baseline(results, args.save, args.dtype)
+    if args.compare:
+        return 1 if compare_baseline(results, args.compare, args.time_tolerance, args.memory_tolerance) else 0
+    return 0
+
+
+# Función main: Ejecuta las mediciones y las validaciones con handel.wav.
+# Salida:
+#           - Entero, código de salida: 0 si todas las validaciones pasan, 1 si alguna falla.
+def main():
+    bench_resampling()
+    bench_baseband()
+    data = redes4.open_audio("handel.wav")
+    passed = all(row["ok"] for row in validate_baseband(data))
+    bench_ddc(data)
+    passed = validate_ddc_blocks(data) and passed
+    passed = validate_modulate_file() and passed
+    passed = all(row["ok"] for row in validate_precision(data)) and passed
+    bench_fdm(data, scheme="AM")
+    bench_fdm(data, scheme="FM")
+    if not passed:
+        print("Validación fallida", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["suite"]:
+        sys.exit(suite_main(sys.argv[2:]))
+    sys.exit(main())
@@ -0,0 +1,194 @@
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+import numpy as np
+import baseband
+import channel
+import precision
+import redes4
+
+# Ensayos que se procesan juntos como un arreglo 2D. Limita la memoria: en FM cada ensayo ocupa varias veces el largo
+# del mensaje (ver baseband.baseband_rate).
+TRIAL_BATCH = 16
+
+# Columnas de la tabla de resultados.
+COLUMNS = ("scheme", "percentage", "snr_db", "trials", "output_snr_db", "output_snr_std", "correlation",
+           "correlation_std")
+
+# Mensaje de los procesos del barrido; se envía una sola vez a cada proceso (ver _init_worker).
+_message = None
+
+
+# Función _init_worker: Guarda el mensaje en el proceso, para no enviarlo con cada punto del barrido.
+def _init_worker(data, dtype):
+    global _message
+    _message = data
+    precision.set_dtype(dtype)
+
+
+# Función sweep_message: Mensaje que se modula en el barrido. El audio se normaliza a amplitud máxima 1, para que el
+# porcentaje sea un índice de modulación relativo a la amplitud máxima en ambos esquemas (el audio sin normalizar, en
+# el rango de 16 bits, deja la portadora AM miles de veces bajo el mensaje con cualquier porcentaje):
+#           - AM: envolvente 1 + m*x, con m = porcentaje/100 (sobre 100% hay sobremodulación).
+#           - FM: desviación máxima igual a porcentaje/100 veces el ancho de banda del mensaje (la mitad de su
+#             frecuencia de muestreo), es decir índice de modulación beta = porcentaje/100.
+# Entradas:
+#           - data: Arreglo, [frecuencia de muestreo, datos del mensaje].
+#           - scheme: String, "AM" o "FM".
+# Salida:
+#           - Arreglo, [frecuencia de muestreo, mensaje para baseband.am_modulation_iq o fm_modulation_iq].
+def sweep_message(data, scheme):
+    peak = np.max(np.abs(data[1])) if len(data[1]) > 0 else 0
+    x = np.asarray(data[1], dtype=float) / peak if peak > 0 else np.zeros(len(data[1]))
+    if scheme == "FM":
+        # La fase es m*integral(x), con x en rad/s: con amplitud pi*rate la desviación máxima es m*rate/2 Hz.
+        x = x * (np.pi * data[0])
+    return [data[0], x]
+
+
+# Función simulate_point: Simula un punto del barrido: modula el mensaje normalizado una vez (en banda base, ver
+# sweep_message y baseband), lo pasa por el canal en varios ensayos con ruido independiente y mide la calidad de cada
+# mensaje recuperado. Los ensayos se procesan de a TRIAL_BATCH filas.
+# Entradas:
+#           - scheme: String, "AM" o "FM".
+#           - percentage: Entero, porcentaje de modulación (índice relativo a la amplitud máxima, ver sweep_message).
+#           - snr_db: Número, SNR de canal en dB (ver channel.noise_std).
+#           - trials: Entero, número de ensayos.
+#           - seed: np.random.SeedSequence del punto, para que los resultados no dependan del orden de ejecución.
+#           - fading: None o "rayleigh" (ver channel.transmit).
+#           - doppler: Número, desplazamiento Doppler máximo en Hz.
+#           - data: Arreglo opcional, [frecuencia de muestreo, datos del mensaje]. Por defecto el del proceso.
+# Salida:
+#           - Diccionario con las columnas de COLUMNS.
+def simulate_point(scheme, percentage, snr_db, trials, seed, fading=None, doppler=0.0, data=None):
+    if data is None:
+        data = _message
+    rng = np.random.default_rng(seed)
+    meta_data = [data[0], len(data[1])]
+    message = sweep_message(data, scheme)
+    if scheme == "AM":
+        z, bb_rate = baseband.am_modulation_iq(message, percentage)
+    else:
+        z, bb_rate = baseband.fm_modulation_iq(message, percentage)
+    correlation = []
+    output_snr = []
+    for start in range(0, trials, TRIAL_BATCH):
+        count = min(TRIAL_BATCH, trials - start)
+        received, gains = channel.transmit(z, bb_rate, data[0], snr_db, count, rng, fading, doppler)
+        if scheme == "AM":
+            if gains is not None:
+                # El demodulador coherente conoce la fase del canal (portadora recuperada), no su amplitud.
+                received *= np.conj(gains) / np.maximum(np.abs(gains), 1e-12)
+            recovered = baseband.am_demodulation_iq(received, bb_rate, meta_data)
+        else:
+            recovered = baseband.fm_demodulation_iq(received, bb_rate, percentage, meta_data)
+        rho, snr = channel.quality(recovered, data[1])
+        correlation.append(rho)
+        output_snr.append(snr)
+    correlation = np.concatenate(correlation)
+    output_snr = np.concatenate(output_snr)
+    return {"scheme": scheme, "percentage": percentage, "snr_db": snr_db, "trials": trials,
+            "output_snr_db": output_snr.mean(), "output_snr_std": output_snr.std(),
+            "correlation": correlation.mean(), "correlation_std": correlation.std()}
+
+
+# Función format_table: Tabla de texto con los resultados del barrido, ordenada por esquema, porcentaje y SNR.
+# Entrada:
+#           - rows: Lista de diccionarios (ver simulate_point).
+# Salida:
+#           - String.
+def format_table(rows):
+    lines = ["%-6s %5s %8s %7s %12s %9s %12s %10s" % ("Esq.", "%", "SNR in", "Ens.", "SNR out (dB)", "Desv.",
+                                                      "Correlación", "Desv.")]
+    for row in sorted(rows, key=lambda row: (row["scheme"], row["percentage"], row["snr_db"])):
+        lines.append("%-6s %5d %8.1f %7d %12.2f %9.2f %12.4f %10.4f"
+                     % tuple(row[column] for column in COLUMNS))
+    return "\n".join(lines)
+
+
+# Función write_csv: Guarda los resultados del barrido como CSV, con las columnas de COLUMNS.
+# Entradas:
+#           - path: String, nombre del archivo.
+#           - rows: Lista de diccionarios (ver simulate_point).
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+# Función run_sweep: Barrido de Monte Carlo sobre todas las combinaciones de esquema, porcentaje de modulación y SNR de
+# canal. Cada punto tiene su propia semilla derivada de seed, por lo que el resultado es el mismo con cualquier número
+# de procesos.
+# Entradas:
+#           - data: Arreglo, [frecuencia de muestreo, datos del mensaje] (ver redes4.open_audio).
+#           - schemes: Lista, esquemas ("AM" y/o "FM").
+#           - percentages: Lista, porcentajes de modulación.
+#           - snrs: Lista, SNR de canal en dB.
+#           - trials: Entero, ensayos por punto.
+#           - workers: Entero, procesos en paralelo (None: todos los núcleos).
+#           - seed: Entero, semilla del barrido.
+#           - fading, doppler: Desvanecimiento del canal (ver channel.transmit).
+#           - dtype: Precisión de trabajo (ver precision).
+# Salida:
+#           - Lista de diccionarios, uno por punto (ver simulate_point).
+def run_sweep(data, schemes, percentages, snrs, trials, workers=None, seed=0, fading=None, doppler=0.0,
+              dtype="float64"):
+    points = list(itertools.product(schemes, percentages, snrs))
+    seeds = np.random.SeedSequence(seed).spawn(len(points))
+    if workers is None:
+        workers = os.cpu_count()
+    if workers > 1 and len(points) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(points)), initializer=_init_worker,
+                                 initargs=(data, dtype)) as pool:
+            futures = [pool.submit(simulate_point, scheme, p, snr, trials, point_seed, fading, doppler)
+                       for (scheme, p, snr), point_seed in zip(points, seeds)]
+            return [future.result() for future in futures]
+    previous = precision.get_dtype()
+    precision.set_dtype(dtype)
+    try:
+        return [simulate_point(scheme, p, snr, trials, point_seed, fading, doppler, data)
+                for (scheme, p, snr), point_seed in zip(points, seeds)]
+    finally:
+        precision.set_dtype(previous)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Barrido de Monte Carlo de la calidad de la demodulación AM/FM "
+                                                 "frente al porcentaje de modulación y la SNR del canal.")
+    parser.add_argument("file", nargs="?", default="handel.wav", help="archivo de audio del mensaje")
+    parser.add_argument("-s", "--schemes", nargs="+", choices=("AM", "FM"), default=["AM", "FM"],
+                        help="esquemas de modulación")
+    parser.add_argument("-p", "--percentages", nargs="+", type=int, default=[15, 100, 125],
+                        help="porcentajes de modulación (índice relativo a la amplitud máxima del mensaje)")
+    parser.add_argument("--snr", nargs="+", type=float, default=list(range(-5, 31, 5)),
+                        help="SNR de canal (dB)")
+    parser.add_argument("-n", "--trials", type=int, default=32, help="ensayos por punto")
+    parser.add_argument("-j", "--workers", type=int, default=0, help="procesos en paralelo (0: todos los núcleos)")
+    parser.add_argument("--seed", type=int, default=0, help="semilla del barrido")
+    parser.add_argument("--fading", choices=("rayleigh",), default=None, help="desvanecimiento del canal")
+    parser.add_argument("--doppler", type=float, default=0.0, help="desplazamiento Doppler máximo (Hz)")
+    parser.add_argument("--dtype", choices=precision.DTYPES, default="float64", help="precisión del procesamiento")
+    parser.add_argument("--csv", help="guarda los resultados en este archivo CSV")
+    args = parser.parse_args(argv)
+    if args.trials < 1:
+        parser.error("se necesita al menos un ensayo por punto")
+    if 0 in args.percentages and "FM" in args.schemes:
+        parser.error("el porcentaje de modulación debe ser positivo para demodular FM")
+    data = redes4.open_audio(args.file)
+    start = time.perf_counter()
+    rows = run_sweep(data, args.schemes, args.percentages, args.snr, args.trials, args.workers or None, args.seed,
+                     args.fading, args.doppler, args.dtype)
+    print(format_table(rows))
+    print("%d puntos x %d ensayos en %.1f s" % (len(rows), args.trials, time.perf_counter() - start))
+    if args.csv:
+        write_csv(args.csv, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+from fractions import Fraction
+import functools
+import math
+import scipy.signal as sg
+import numpy as np
+import precision
+
+# Cantidad de ceros a cada lado del filtro prototipo (en periodos de la tasa mayor) y parámetro de la ventana Kaiser.
+# Son los mismos valores que usa scipy.signal.resample_poly.
+HALF_LEN = 10
+KAISER_BETA = 5.0
+
+# Atenuación (dB) de la banda de rechazo del filtro de la primera etapa de diezmado (ver decimation_filter).
+STOP_ATTENUATION = 80
+
+
+# Función rational_ratio: Calcula el factor racional reducido entre dos frecuencias de muestreo.
+# Entradas:
+#           - rate_in: Número, frecuencia de muestreo de entrada.
+#           - rate_out: Número, frecuencia de muestreo de salida.
+#           - max_denominator: Entero, límite del denominador cuando las frecuencias no son enteras.
+# Salida:
+#           - Tupla (up, down) de enteros coprimos tal que rate_out/rate_in = up/down.
+def rational_ratio(rate_in, rate_out, max_denominator=100000):
+    ratio = (Fraction(rate_out) / Fraction(rate_in)).limit_denominator(max_denominator)
+    return ratio.numerator, ratio.denominator
+
+
+# Función polyphase_filter: Diseña el filtro prototipo para un factor up/down. El resultado se guarda en caché, por lo
+# que cada factor se diseña una sola vez.
+# Entradas:
+#           - up: Entero, factor de interpolación.
+#           - down: Entero, factor de diezmado.
+# Salida:
+#           - h: Arreglo de solo lectura, coeficientes del filtro (con ceros al inicio para alinear el retardo).
+#           - delay: Entero, retardo del filtro en muestras de la señal interpolada. Es múltiplo de down.
+@functools.lru_cache(maxsize=32)
+def polyphase_filter(up, down):
+    max_rate = max(up, down)
+    if max_rate == 1:
+        # Sin cambio de frecuencia el filtro es la identidad.
+        h = np.ones(1)
+        h.setflags(write=False)
+        return h, 0
+    half_len = HALF_LEN * max_rate
+    h = sg.firwin(2 * half_len + 1, 1 / max_rate, window=("kaiser", KAISER_BETA)) * up
+    # Se agregan ceros al inicio para que el retardo sea múltiplo de down y la salida quede alineada con la entrada.
+    pre = -half_len % down
+    h = np.concatenate([np.zeros(pre), h])
+    h.setflags(write=False)
+    return h, half_len + pre
+
+
+# Función decimation_filter: Diseña el filtro FIR de la primera etapa (diezmado entero por factor). Solo debe proteger
+# la banda del mensaje, por lo que la banda de transición va desde out_rate/2 hasta (rate/factor - out_rate/2), mucho
+# más ancha que la de un diezmador genérico, y el filtro resulta corto. El resultado queda en caché.
+# Entradas:
+#           - rate: Número, frecuencia de muestreo de entrada.
+#           - out_rate: Número, frecuencia de muestreo final (define la banda que se conserva).
+#           - factor: Entero, factor de diezmado.
+# Salida:
+#           - Tupla (h, delay) con el formato de polyphase_filter.
+@functools.lru_cache(maxsize=32)
+def decimation_filter(rate, out_rate, factor):
+    if factor == 1:
+        return polyphase_filter(1, 1)
+    nyquist = rate / 2
+    width = (rate / factor - out_rate) / nyquist
+    numtaps, beta = sg.kaiserord(STOP_ATTENUATION, width)
+    half_len = numtaps // 2
+    h = sg.firwin(2 * half_len + 1, (rate / factor / 2) / nyquist, window=("kaiser", beta))
+    # Igual que en polyphase_filter, el retardo se alinea a un múltiplo del factor.
+    pre = -half_len % factor
+    h = np.concatenate([np.zeros(pre), h])
+    h.setflags(write=False)
+    return h, half_len + pre
+
+
+# Clase Resampler: Conversor de frecuencia de muestreo polifásico por un factor racional up/down, con estado, que
+# permite procesar una señal larga por bloques. La concatenación de las salidas de process() y flush() es igual a
+# aplicar resample() sobre la señal completa. Las señales pueden tener varias filas; se procesa el último eje.
+class Resampler:
+    # Constructor
+    # Entradas:
+    #           - up: Entero, factor de interpolación.
+    #           - down: Entero, factor de diezmado.
+    #           - design: Tupla (h, delay) opcional con otro filtro, con el mismo formato que entrega polyphase_filter
+    #                     (retardo múltiplo de down). Por defecto se usa polyphase_filter(up, down).
+    #           - dtype: Precisión de trabajo (ver precision), o None para la actual.
+    def __init__(self, up, down, design=None, dtype=None):
+        g = math.gcd(up, down)
+        self.up = up // g
+        self.down = down // g
+        self.dtype = precision.resolve(dtype)
+        h, self.delay = polyphase_filter(self.up, self.down) if design is None else design
+        # Se completa el filtro con ceros hasta un múltiplo de up: con menos coeficientes que up (por ejemplo el filtro
+        # identidad de ddc), upfirdn entregaría una muestra menos por segmento y cada bloque perdería la última.
+        self.h = np.concatenate([h, np.zeros(-len(h) % self.up)]).astype(self.dtype, copy=False)
+        # Cantidad de muestras de entrada que intervienen en cada muestra de salida.
+        self.taps = -(-len(self.h) // self.up)
+        self._buffer = None
+        self._buffer_start = 0
+        self._received = 0
+        self._produced = 0
+
+    # Función _first_input: Índice de la primera muestra de entrada usada por la salida n, alineado a un múltiplo de
+    # down para que la grilla de salida de upfirdn coincida con la global.
+    def _first_input(self, n):
+        first = (n * self.down + self.delay) // self.up - self.taps + 1
+        return (first // self.down) * self.down
+
+    # Función _produce: Calcula las salidas desde la última entregada hasta n_end (sin incluir). Las muestras de
+    # entrada fuera de la señal se consideran ceros.
+    def _produce(self, n_end):
+        count = n_end - self._produced
+        if count <= 0:
+            return np.zeros(self._buffer.shape[:-1] + (0,), dtype=self._buffer.dtype)
+        start = self._first_input(self._produced)
+        end = (((n_end - 1) * self.down + self.delay) // self.up) + 1
+        segment = np.zeros(self._buffer.shape[:-1] + (end - start,), dtype=self._buffer.dtype)
+        low = max(start, self._buffer_start)
+        high = min(end, self._buffer_start + self._buffer.shape[-1])
+        segment[..., low - start:high - start] = self._buffer[..., low - self._buffer_start:high - self._buffer_start]
+        out = sg.upfirdn(self.h, segment, self.up, self.down, axis=-1)
+        offset = self._produced + (self.delay - start * self.up) // self.down
+        out = out[..., offset:offset + count]
+        self._produced = n_end
+        # Se descartan las muestras que ya no serán necesarias.
+        keep = max(self._first_input(self._produced), self._buffer_start)
+        self._buffer = self._buffer[..., keep - self._buffer_start:]
+        self._buffer_start = keep
+        return out
+
+    # Función process: Recibe un bloque de entrada y entrega todas las salidas que ya pueden calcularse.
+    # Entrada:
+    #           - block: Arreglo, bloque consecutivo de la señal de entrada.
+    # Salida:
+    #           - Arreglo con el bloque de salida (puede estar vacío).
+    def process(self, block):
+        # Las señales enteras se convierten a punto flotante; las complejas (banda base) se mantienen complejas.
+        block = precision.working(block, self.dtype)
+        if self._buffer is None:
+            self._buffer = block[..., :0]
+        self._buffer = np.concatenate([self._buffer, block], axis=-1)
+        self._received += block.shape[-1]
+        return self._produce((self._received * self.up - 1 - self.delay) // self.down + 1)
+
+    # Función flush: Entrega las salidas restantes al terminar la señal.
+    # Salida:
+    #           - Arreglo con las últimas muestras, hasta completar ceil(largo_entrada*up/down) muestras.
+    def flush(self):
+        if self._buffer is None:
+            return np.zeros(0, dtype=self.dtype)
+        return self._produce(-(-self._received * self.up // self.down))
+
+
+# Clase Decimator: Conversor de bajada en dos etapas, con la misma interfaz y el mismo largo de salida que Resampler.
+# Primero diezma por un factor entero con el filtro corto de decimation_filter, que solo protege la banda de salida y
+# deja la frecuencia intermedia sobre el doble de la de salida; luego el conversor polifásico lleva la señal a la
+# frecuencia final. Con factores grandes (por ejemplo de 4 veces la portadora a la frecuencia del audio) el filtro de
+# una sola etapa es muy largo y esta versión calcula varias veces menos productos.
+class Decimator:
+    # Constructor
+    # Entradas:
+    #           - rate_in: Número, frecuencia de muestreo de entrada.
+    #           - rate_out: Número, frecuencia de muestreo de salida (menos de la mitad de rate_in).
+    #           - dtype: Precisión de trabajo (ver precision), o None para la actual.
+    def __init__(self, rate_in, rate_out, dtype=None):
+        self.up, self.down = rational_ratio(rate_in, rate_out)
+        self.dtype = precision.resolve(dtype)
+        factor = int(rate_in // (2 * rate_out))
+        self._first = Resampler(1, factor, decimation_filter(rate_in, rate_out, factor), self.dtype)
+        self._second = Resampler(*rational_ratio(Fraction(rate_in) / factor, rate_out), dtype=self.dtype)
+        self._received = 0
+        self._produced = 0
+
+    # Función process: Recibe un bloque de entrada y entrega todas las salidas que ya pueden calcularse.
+    def process(self, block):
+        self._received += np.shape(block)[-1]
+        out = self._second.process(self._first.process(block))
+        self._produced += out.shape[-1]
+        return out
+
+    # Función flush: Entrega las salidas restantes, hasta completar ceil(largo_entrada*up/down) muestras como en
+    # Resampler (el redondeo de cada etapa puede agregar una muestra al final).
+    def flush(self):
+        out = self._second.process(self._first.flush())
+        out = np.concatenate([out, self._second.flush()], axis=-1)
+        return out[..., :max(0, -(-self._received * self.up // self.down) - self._produced)]
+
+
+# Función converter: Conversor con estado para un cambio de frecuencia de muestreo: Decimator si se baja la frecuencia
+# a menos de la mitad, Resampler en los demás casos.
+# Entradas:
+#           - rate_in: Número, frecuencia de muestreo de entrada.
+#           - rate_out: Número, frecuencia de muestreo de salida.
+#           - dtype: Precisión de trabajo (ver precision), o None para la actual.
+# Salida:
+#           - Objeto con los métodos process y flush.
+def converter(rate_in, rate_out, dtype=None):
+    if rate_in >= 4 * rate_out:
+        return Decimator(rate_in, rate_out, dtype)
+    return Resampler(*rational_ratio(rate_in, rate_out), dtype=dtype)
+
+
+# Función fit_length: Recorta o completa con ceros el último eje de un arreglo para que tenga exactamente length
+# muestras.
+def fit_length(x, length):
+    if length is None or x.shape[-1] == length:
+        return x
+    if x.shape[-1] > length:
+        return x[..., :length]
+    return np.concatenate([x, np.zeros(x.shape[:-1] + (length - x.shape[-1],), dtype=x.dtype)], axis=-1)
+
+
+# Función resample: Cambia la frecuencia de muestreo de una señal completa usando el filtro polifásico (en dos etapas
+# si se baja la frecuencia, ver converter).
+# Entradas:
+#           - x: Arreglo, señal a convertir. Si tiene varias filas, cada una se convierte por separado.
+#           - rate_in: Número, frecuencia de muestreo de la señal.
+#           - rate_out: Número, frecuencia de muestreo deseada.
+#           - length: Entero opcional, número exacto de muestras de la salida.
+#           - dtype: Precisión de trabajo (ver precision), o None para la actual.
+# Salida:
+#           - Arreglo con la señal a la nueva frecuencia de muestreo.
+def resample(x, rate_in, rate_out, length=None, dtype=None):
+    resampler = converter(rate_in, rate_out, dtype)
+    out = np.concatenate([resampler.process(x), resampler.flush()], axis=-1)
+    return fit_length(out, length)
+
+
+# Función resample_stream: Versión por bloques de resample.
+# Entradas:
+#           - blocks: Iterable de arreglos, bloques consecutivos de la señal.
+#           - rate_in: Número, frecuencia de muestreo de la señal.
+#           - rate_out: Número, frecuencia de muestreo deseada.
+#           - length: Entero opcional, número exacto de muestras de la salida completa.
+#           - dtype: Precisión de trabajo (ver precision), o None para la actual.
+# Salida:
+#           - Generador de arreglos, bloques consecutivos de la señal convertida.
+def resample_stream(blocks, rate_in, rate_out, length=None, dtype=None):
+    resampler = converter(rate_in, rate_out, dtype)
+    produced = 0
+    for block in blocks:
+        out = resampler.process(block)
+        if length is not None:
+            out = out[..., :max(length - produced, 0)]
+        produced += out.shape[-1]
+        if out.shape[-1] > 0:
+            yield out
+    out = resampler.flush()
+    if length is not None:
+        out = fit_length(out[..., :max(length - produced, 0)], length - produced)
+    if out.shape[-1] > 0:
+        yield out
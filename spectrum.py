@@ -0,0 +1,127 @@
+from collections import OrderedDict
+import hashlib
+import scipy.fft as fft
+import scipy.signal as sg
+import numpy as np
+import precision
+
+# Cantidad máxima de espectros guardados en la caché. Al superarla se descarta el usado hace más tiempo.
+CACHE_SIZE = 16
+
+# Largo por defecto de los segmentos del modo promediado (Welch).
+WELCH_NPERSEG = 4096
+
+_cache = OrderedDict()
+
+
+# Función _key: Llave de la caché de un espectro: resumen del contenido del arreglo más los parámetros del cálculo.
+# Se usa el contenido y no la identidad del arreglo, para que un arreglo modificado no entregue un espectro antiguo.
+def _key(x, *params):
+    x = np.ascontiguousarray(x)
+    digest = hashlib.blake2b(x.view(np.uint8), digest_size=16).hexdigest()
+    return (digest, x.shape, x.dtype.str) + params
+
+
+# Función _cached: Busca un resultado en la caché o lo calcula y lo guarda.
+def _cached(key, function):
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+    value = function()
+    _cache[key] = value
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return value
+
+
+# Función clear_cache: Vacía la caché de espectros.
+def clear_cache():
+    _cache.clear()
+
+
+# Función real_fft: Transformada de una señal real (solo frecuencias no negativas), con el largo completado con ceros
+# hasta un largo rápido para la FFT. El resultado queda en caché.
+# Entradas:
+#           - x: Arreglo real, señal.
+#           - rate: Número, frecuencia de muestreo.
+#           - pad: Booleano, si es True se completa hasta un largo rápido (scipy.fft.next_fast_len).
+#           - dtype: Precisión del cálculo (ver precision), o None para la actual.
+# Salida:
+#           - freqs: Arreglo, frecuencias en Hz.
+#           - values: Arreglo complejo, transformada.
+def real_fft(x, rate, pad=True, dtype=None):
+    x = precision.working(x, dtype)
+
+    def compute():
+        freqs, values = _rfft(x, rate, pad)
+        values.setflags(write=False)
+        return freqs, values
+    return _cached(_key(x, rate, pad, "rfft"), compute)
+
+
+# Función _rfft: FFT real sin caché, completando con ceros hasta un largo rápido si se pide.
+def _rfft(x, rate, pad):
+    n = fft.next_fast_len(len(x), real=True) if pad else len(x)
+    return fft.rfftfreq(n, 1/rate), fft.rfft(x, n)
+
+
+# Función magnitude: Magnitud del espectro de una señal real, en las frecuencias no negativas.
+# Entradas:
+#           - x: Arreglo real, señal.
+#           - rate: Número, frecuencia de muestreo.
+#           - welch: Booleano, si es True se usa el espectro promediado de Welch (raíz del espectro de potencia), útil
+#                    para señales largas porque reduce la varianza y el número de puntos.
+#           - nperseg: Entero, largo de los segmentos del modo Welch.
+#           - pad: Booleano, completar hasta un largo rápido para la FFT (solo sin Welch).
+#           - dtype: Precisión del cálculo (ver precision), o None para la actual.
+# Salida:
+#           - freqs: Arreglo, frecuencias en Hz.
+#           - values: Arreglo, magnitud del espectro.
+def magnitude(x, rate, welch=False, nperseg=WELCH_NPERSEG, pad=True, dtype=None):
+    x = precision.working(x, dtype)
+    if welch:
+        def compute():
+            freqs, power = sg.welch(x, fs=rate, nperseg=min(nperseg, len(x)), scaling="spectrum")
+            values = np.sqrt(power)
+            values.setflags(write=False)
+            return freqs, values
+        return _cached(_key(x, rate, nperseg, "welch"), compute)
+
+    def compute():
+        freqs, values = _rfft(x, rate, pad)
+        values = np.abs(values)
+        values.setflags(write=False)
+        return freqs, values
+    return _cached(_key(x, rate, pad, "abs"), compute)
+
+
+# Función centered_magnitude: Magnitud del espectro completo de una señal real, ordenada de la frecuencia más negativa
+# a la más positiva (como fftshift). Se arma desde la FFT real usando la simetría |X(-f)| = |X(f)|.
+# Entradas:
+#           - x: Arreglo real, señal.
+#           - rate: Número, frecuencia de muestreo.
+#           - pad: Booleano, completar hasta un largo rápido para la FFT.
+#           - dtype: Precisión del cálculo (ver precision), o None para la actual.
+# Salida:
+#           - freqs: Arreglo, frecuencias en Hz.
+#           - values: Arreglo, magnitud del espectro.
+def centered_magnitude(x, rate, pad=True, dtype=None):
+    freqs, values = magnitude(x, rate, pad=pad, dtype=dtype)
+    n = fft.next_fast_len(len(x), real=True) if pad else len(x)
+    # Con n par la frecuencia de Nyquist aparece una sola vez, en el extremo negativo.
+    positive = slice(0, -1) if n % 2 == 0 else slice(0, None)
+    return (np.concatenate([-freqs[:0:-1], freqs[positive]]),
+            np.concatenate([values[:0:-1], values[positive]]))
+
+
+# Función full_fft: Transformada completa (todas las frecuencias, en el orden de fftp.fft) de una señal real, calculada
+# con la FFT real y la simetría conjugada.
+# Entradas:
+#           - x: Arreglo real, señal.
+#           - dtype: Precisión del cálculo (ver precision), o None para la actual.
+# Salida:
+#           - Arreglo complejo con la transformada, igual a scipy.fftpack.fft(x).
+def full_fft(x, dtype=None):
+    _, half = real_fft(x, 1, pad=False, dtype=dtype)
+    n = len(x)
+    return np.concatenate([half, np.conj(half[(n + 1) // 2 - 1:0:-1])])
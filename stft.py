@@ -0,0 +1,128 @@
+from numpy.lib.stride_tricks import sliding_window_view
+import scipy.fft as fft
+import scipy.signal as sg
+import numpy as np
+import precision
+
+# Tamaño de los bloques (en muestras) con que se recorre una señal completa.
+BLOCK_SIZE = 65536
+
+
+# Clase StreamingSTFT: Espectrograma incremental. Recibe la señal por bloques y entrega las columnas (segmentos) a
+# medida que se completan, con los mismos valores que scipy.signal.spectrogram (mode "psd", ventana con tendencia
+# constante removida y escala "spectrum" o "density").
+class StreamingSTFT:
+    # Constructor
+    # Entradas:
+    #           - rate: Número, frecuencia de muestreo.
+    #           - nperseg: Entero, largo de cada segmento.
+    #           - noverlap: Entero, muestras compartidas entre segmentos consecutivos (por defecto nperseg//8).
+    #           - window: Ventana, en cualquier formato aceptado por scipy.signal.get_window.
+    #           - scaling: String, "spectrum" o "density".
+    #           - dtype: Precisión del cálculo (ver precision), o None para la actual.
+    def __init__(self, rate, nperseg=1024, noverlap=None, window=("tukey", .25), scaling="spectrum", dtype=None):
+        self.dtype = precision.resolve(dtype)
+        self.rate = rate
+        self.nperseg = nperseg
+        self.noverlap = nperseg // 8 if noverlap is None else noverlap
+        self.hop = nperseg - self.noverlap
+        window = sg.get_window(window, nperseg)
+        if scaling == "density":
+            self.scale = 1.0 / (rate * (window * window).sum())
+        else:
+            self.scale = 1.0 / window.sum() ** 2
+        self.window = window.astype(self.dtype)
+        self.freqs = fft.rfftfreq(nperseg, 1 / rate)
+        self._buffer = np.zeros(0, dtype=self.dtype)
+        self._columns = 0
+
+    # Función columns_for: Número de columnas que entrega una señal de length muestras.
+    def columns_for(self, length):
+        return max(0, (length - self.noverlap) // self.hop)
+
+    # Función times: Instante central de cada columna.
+    def times(self, count):
+        return (self.nperseg / 2 + np.arange(count) * self.hop) / self.rate
+
+    # Función process: Recibe un bloque de la señal.
+    # Entrada:
+    #           - block: Arreglo real, bloque consecutivo de la señal.
+    # Salida:
+    #           - Arreglo (columnas x frecuencias) con los segmentos completados en este bloque (puede estar vacío).
+    def process(self, block):
+        self._buffer = np.concatenate([self._buffer, precision.working(block, self.dtype)])
+        count = self.columns_for(len(self._buffer))
+        if count == 0:
+            return np.zeros((0, len(self.freqs)), dtype=self.dtype)
+        segments = sliding_window_view(self._buffer, self.nperseg)[::self.hop][:count]
+        segments = (segments - segments.mean(axis=1, keepdims=True)) * self.window
+        power = np.abs(fft.rfft(segments, axis=1)) ** 2 * self.dtype.type(self.scale)
+        # Espectro de un lado: se duplican todas las frecuencias salvo 0 y Nyquist.
+        if self.nperseg % 2 == 0:
+            power[:, 1:-1] *= 2
+        else:
+            power[:, 1:] *= 2
+        self._buffer = self._buffer[count * self.hop:]
+        self._columns += count
+        return power
+
+
+# Función _pool: Máximo por grupos consecutivos a lo largo de un eje.
+def _pool(values, size, axis):
+    if size <= 1:
+        return values
+    return np.maximum.reduceat(values, np.arange(0, values.shape[axis], size), axis=axis)
+
+
+# Función spectrogram_view: Calcula el espectrograma de una señal larga con memoria acotada. Los segmentos se reducen a
+# medida que se generan a una vista de a lo más width columnas y height filas (máximo de cada grupo), suficiente para
+# graficar. Opcionalmente se guarda la matriz completa en un archivo .npy, escrito por bloques. Igual que
+# scipy.signal.spectrogram, si la señal es más corta que nperseg se usa un solo segmento del largo de la señal.
+# Entradas:
+#           - data: Arreglo real (o np.memmap), señal.
+#           - rate: Número, frecuencia de muestreo.
+#           - width: Entero, número máximo de columnas (tiempo) de la vista.
+#           - height: Entero, número máximo de filas (frecuencia) de la vista.
+#           - nperseg, noverlap, window, scaling: Parámetros del espectrograma (ver StreamingSTFT).
+#           - out_file: String opcional, archivo .npy donde se guarda la matriz completa (columnas x frecuencias).
+#           - dtype: Precisión del cálculo y del archivo (ver precision), o None para la actual.
+# Salida:
+#           - freqs: Arreglo, frecuencias de la vista.
+#           - times: Arreglo, instantes de la vista.
+#           - Sxx: Arreglo (frecuencias x tiempo), vista reducida del espectrograma.
+def spectrogram_view(data, rate, width, height, nperseg=1024, noverlap=None, window=("tukey", .25),
+                     scaling="spectrum", out_file=None, dtype=None):
+    if 0 < len(data) < nperseg:
+        nperseg = len(data)
+        if noverlap is not None:
+            noverlap = min(noverlap, nperseg - 1)
+    transform = StreamingSTFT(rate, nperseg, noverlap, window, scaling, dtype)
+    count = transform.columns_for(len(data))
+    n_freqs = len(transform.freqs)
+    time_size = max(1, -(-count // width))
+    freq_size = max(1, -(-n_freqs // height))
+    view = np.zeros((-(-count // time_size), -(-n_freqs // freq_size)), dtype=transform.dtype)
+    stored = None
+    if out_file is not None:
+        stored = np.lib.format.open_memmap(out_file, mode="w+", dtype=transform.dtype, shape=(count, n_freqs))
+
+    done = 0
+    for i in range(0, len(data), BLOCK_SIZE):
+        power = transform.process(data[i:i + BLOCK_SIZE])
+        if len(power) == 0:
+            continue
+        if stored is not None:
+            stored[done:done + len(power)] = power
+        # Cada columna nueva se acumula (máximo) en la columna de la vista que le corresponde.
+        groups = (done + np.arange(len(power))) // time_size
+        starts = np.flatnonzero(np.diff(groups, prepend=-1))
+        pooled = _pool(np.maximum.reduceat(power, starts, axis=0), freq_size, 1)
+        view[groups[starts]] = np.maximum(view[groups[starts]], pooled)
+        done += len(power)
+    if stored is not None:
+        stored.flush()
+        del stored
+
+    times = transform.times(count)[::time_size]
+    freqs = transform.freqs[::freq_size]
+    return freqs, times, view.T